@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 import os
 
@@ -9,6 +10,8 @@ from dotenv import load_dotenv
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 
+_dotenv_loaded = False
+
 
 @dataclass(frozen=True)
 class Settings:
@@ -17,19 +20,33 @@ class Settings:
     db_path: Path
 
 
-def get_settings() -> Settings:
-    load_dotenv(PROJECT_ROOT / ".env")
+def _load_dotenv_once() -> None:
+    # El .env se lee una sola vez por proceso (aunque se limpie el cache de get_settings)
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        load_dotenv(PROJECT_ROOT / ".env")
+        _dotenv_loaded = True
 
-    token = os.getenv("TELEGRAM_BOT_TOKEN", "").strip()
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Cacheado: la primera llamada lee el entorno, las siguientes retornan el mismo Settings.
+    En tests se puede usar get_settings.cache_clear().
+    """
+    _load_dotenv_once()
+    env = os.environ
+
+    token = env.get("TELEGRAM_BOT_TOKEN", "").strip()
     if not token:
         raise RuntimeError("Falta TELEGRAM_BOT_TOKEN en tu .env")
 
-    owner_raw = os.getenv("OWNER_TELEGRAM_USER_ID", "").strip()
+    owner_raw = env.get("OWNER_TELEGRAM_USER_ID", "").strip()
     if not owner_raw.isdigit():
         raise RuntimeError("Falta OWNER_TELEGRAM_USER_ID (debe ser numerico) en tu .env")
     owner_id = int(owner_raw)
 
-    db_path_raw = os.getenv("DB_PATH", "data/assistant.db").strip()
+    db_path_raw = env.get("DB_PATH", "data/assistant.db").strip()
     db_path = Path(db_path_raw)
     if not db_path.is_absolute():
         db_path = PROJECT_ROOT / db_path
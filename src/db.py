@@ -1,389 +1,799 @@
 from __future__ import annotations
 
+import logging
+import os
 import sqlite3
-from datetime import datetime
-from typing import Optional, Dict, Any, List, Tuple
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Optional, Dict, Any, Generator, Iterable, Iterator, List, Tuple
 
+log = logging.getLogger("cortana.db")
 
 # ---------------- Core DB ----------------
 
-def connect(db_path: str) -> sqlite3.Connection:
-    con = sqlite3.connect(db_path, check_same_thread=False)
+_CON: Optional[sqlite3.Connection] = None
+# Lectores de solo lectura, uno por hilo (WAL: leen sin esperar al escritor)
+_READERS = threading.local()
+# Serializa las transacciones de escritura sobre la conexion RW compartida
+_WRITE_LOCK = threading.RLock()
+
+
+def connect(db_path: str | os.PathLike[str]) -> sqlite3.Connection:
+    # cached_statements: sqlite3 reutiliza el statement preparado para cada SQL_* constante
+    path = os.fspath(db_path)
+    con = sqlite3.connect(path, check_same_thread=False, cached_statements=256)
     con.row_factory = sqlite3.Row
+
+    # Esperar hasta 30s por el lock en vez de fallar con "database is locked"
+    con.execute("PRAGMA busy_timeout=30000")
+    # WAL + sync NORMAL: cada commit es un append al WAL en vez de 2 fsync (journal + DB)
+    if path != ":memory:":
+        con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute("PRAGMA temp_store=MEMORY")
+    con.execute("PRAGMA mmap_size=268435456")
+    con.execute("PRAGMA cache_size=-65536")
+    # foreign_keys es por conexion
+    con.execute("PRAGMA foreign_keys=ON")
     return con
 
 
+def get_connection(db_path: str | os.PathLike[str]) -> sqlite3.Connection:
+    """
+    Conexion unica del proceso (se abre la primera vez y luego se reutiliza).
+    El bot corre en un solo proceso asyncio, asi que una conexion RW basta.
+    """
+    global _CON
+    if _CON is None:
+        _CON = connect(db_path)
+    return _CON
+
+
+def connect_readonly(db_path: str | os.PathLike[str]) -> sqlite3.Connection:
+    """
+    Conexion de solo lectura (mode=ro). La DB ya debe existir (init_db corre antes en la RW).
+    """
+    uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+    con = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=256)
+    con.row_factory = sqlite3.Row
+
+    con.execute("PRAGMA busy_timeout=30000")
+    con.execute("PRAGMA temp_store=MEMORY")
+    con.execute("PRAGMA mmap_size=268435456")
+    con.execute("PRAGMA cache_size=-65536")
+    return con
+
+
+def get_read_connection(db_path: str | os.PathLike[str]) -> sqlite3.Connection:
+    """
+    Conexion de lectura del hilo actual (se abre la primera vez y luego se reutiliza).
+    Usar para listados, busquedas y export; las escrituras van por get_connection().
+    """
+    con = getattr(_READERS, "con", None)
+    if con is None:
+        con = _READERS.con = connect_readonly(db_path)
+    return con
+
+
+@contextmanager
+def transaction(con: sqlite3.Connection) -> Generator[sqlite3.Connection, None, None]:
+    """
+    Agrupa varias escrituras en un solo commit (rollback si algo falla):
+
+        with dbmod.transaction(con):
+            dbmod.add_task(con, ...)
+            dbmod.add_note(con, ...)
+
+    Los helpers de escritura usan transaction() por dentro: si ya hay una abierta,
+    se suman a ella y el commit lo hace el bloque externo. Un solo escritor a la vez
+    (lock re-entrante por hilo).
+    """
+    with _WRITE_LOCK:
+        if con.in_transaction:
+            yield con
+            return
+
+        # IMMEDIATE toma el lock de escritura al inicio: sin upgrade de lock a mitad del bloque
+        con.execute("BEGIN IMMEDIATE")
+        with con:
+            yield con
+
+
+_dt_now = datetime.now
+
+
 def _now_iso() -> str:
-    return datetime.now().isoformat(timespec="seconds")
+    # Los helpers de escritura aceptan now=...: en lotes se calcula una vez y se pasa a todos
+    return _dt_now().isoformat(timespec="seconds")
+
+
+# Subir SCHEMA_VERSION cada vez que cambie el esquema (tablas, indices, FTS)
+# y, si hace falta algo mas que el DDL de SCHEMA_SQL, agregar su paso en init_db
+SCHEMA_VERSION = 5
+
+SCHEMA_SQL = """
+BEGIN;
+
+-- Usuarios
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    telegram_user_id INTEGER UNIQUE,
+    telegram_chat_id INTEGER,
+    name TEXT,
+    created_at TEXT NOT NULL
+);
+
+-- Notas
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    note_datetime TEXT NOT NULL,
+    text TEXT NOT NULL,
+    tags TEXT,
+    created_at TEXT NOT NULL,
+    FOREIGN KEY(user_id) REFERENCES users(id)
+);
+
+-- Recordatorios (si ya existe en tu proyecto, lo respeta)
+CREATE TABLE IF NOT EXISTS reminders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    message TEXT NOT NULL,
+    schedule TEXT NOT NULL,
+    timezone TEXT,
+    active INTEGER NOT NULL DEFAULT 1,
+    last_run_at TEXT,
+    next_run_at TEXT,
+    created_at TEXT NOT NULL,
+    FOREIGN KEY(user_id) REFERENCES users(id)
+);
+
+-- ---- TAREAS (robusto) ----
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    target_date TEXT NOT NULL, -- YYYY-MM-DD
+    text TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending', -- pending/done/missed
+    created_at TEXT NOT NULL,
+    done_at TEXT,
+    missed_at TEXT,
+    updated_at TEXT,
+    FOREIGN KEY(user_id) REFERENCES users(id)
+);
+
+-- Índices
+-- (user_id, target_date) queda cubierto como prefijo de idx_tasks_user_date_status_id
+DROP INDEX IF EXISTS idx_tasks_user_date;
+-- (user_id, status) queda cubierto como prefijo de idx_tasks_user_status_date
+DROP INDEX IF EXISTS idx_tasks_user_status;
+CREATE INDEX IF NOT EXISTS idx_notes_user_dt ON notes(user_id, note_datetime);
+-- Filtro + ORDER BY id servidos por el indice (sin sort en memoria)
+CREATE INDEX IF NOT EXISTS idx_tasks_user_date_status_id ON tasks(user_id, target_date, status, id);
+CREATE INDEX IF NOT EXISTS idx_reminders_user_active_id ON reminders(user_id, active, id);
+-- Listados por estado ordenados por fecha (global y entre fechas) sin sort en memoria
+CREATE INDEX IF NOT EXISTS idx_tasks_user_status_date ON tasks(user_id, status, target_date DESC, id DESC);
+
+COMMIT;
+"""
 
 
 def init_db(con: sqlite3.Connection) -> None:
-    cur = con.cursor()
-
-    # Usuarios
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        telegram_user_id INTEGER UNIQUE,
-        telegram_chat_id INTEGER,
-        name TEXT,
-        created_at TEXT NOT NULL
-    )
-    """)
-
-    # Notas
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS notes (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        note_datetime TEXT NOT NULL,
-        text TEXT NOT NULL,
-        tags TEXT,
-        created_at TEXT NOT NULL,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )
-    """)
-
-    # Recordatorios (si ya existe en tu proyecto, lo respeta)
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS reminders (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        name TEXT NOT NULL,
-        message TEXT NOT NULL,
-        schedule TEXT NOT NULL,
-        timezone TEXT,
-        active INTEGER NOT NULL DEFAULT 1,
-        last_run_at TEXT,
-        next_run_at TEXT,
-        created_at TEXT NOT NULL,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )
-    """)
-
-    # ---- TAREAS (robusto) ----
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS tasks (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        target_date TEXT NOT NULL, -- YYYY-MM-DD
-        text TEXT NOT NULL,
-        status TEXT NOT NULL DEFAULT 'pending', -- pending/done/missed
-        created_at TEXT NOT NULL,
-        done_at TEXT,
-        missed_at TEXT,
-        updated_at TEXT,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )
-    """)
+    # Esquema ya al dia (arranque en caliente): una sola lectura de PRAGMA y listo
+    version = con.execute("PRAGMA user_version").fetchone()[0]
+    if version == SCHEMA_VERSION:
+        return
+
+    # Todo el DDL en una sola transaccion (un commit en vez de uno por statement).
+    # Es idempotente (IF NOT EXISTS): crea lo que falte, incluidos indices nuevos.
+    con.executescript(SCHEMA_SQL)
+
+    # Migraciones por pasos: cada una corre solo si la DB viene de una version anterior
+    if version < 1:
+        # Tablas creadas antes de versionar el esquema: agregar columnas si faltan
+        _ensure_column(con, "tasks", "done_at", "TEXT")
+        _ensure_column(con, "tasks", "missed_at", "TEXT")
+        _ensure_column(con, "tasks", "updated_at", "TEXT")
+        _init_fts(con)
+
+    if version < 5:
+        # Estadisticas para que el planner elija bien entre los indices de tasks
+        con.execute("ANALYZE")
+
+    con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    con.commit()
 
-    # Migración liviana: agregar columnas si faltan
-    _ensure_column(con, "tasks", "done_at", "TEXT")
-    _ensure_column(con, "tasks", "missed_at", "TEXT")
-    _ensure_column(con, "tasks", "updated_at", "TEXT")
 
-    # Índices
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_date ON tasks(user_id, target_date)")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_status ON tasks(user_id, status)")
+def _init_fts(con: sqlite3.Connection) -> None:
+    """
+    Indices FTS5 (trigram) sobre tasks.text y notes.text para que buscar no escanee toda la tabla.
+    Se mantienen sincronizados con triggers. Si SQLite no trae FTS5, search_all sigue con LIKE.
+    """
+    for table in ("tasks", "notes"):
+        fts = f"{table}_fts"
+        existed = con.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (fts,)).fetchone()
+        try:
+            con.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} "
+                f"USING fts5(text, content='{table}', content_rowid='id', tokenize='trigram')"
+            )
+        except sqlite3.OperationalError as e:
+            log.warning("FTS5 no disponible, la busqueda usara LIKE: %s", e)
+            return
+
+        con.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, text) VALUES (new.id, new.text);
+        END
+        """)
+        con.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, text) VALUES ('delete', old.id, old.text);
+        END
+        """)
+        con.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF text ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, text) VALUES ('delete', old.id, old.text);
+            INSERT INTO {fts}(rowid, text) VALUES (new.id, new.text);
+        END
+        """)
+
+        # Tabla FTS nueva sobre datos existentes: indexar lo que ya hay
+        if not existed:
+            con.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
 
     con.commit()
 
 
 def _ensure_column(con: sqlite3.Connection, table: str, col: str, coltype: str) -> None:
-    cur = con.cursor()
-    cur.execute(f"PRAGMA table_info({table})")
-    cols = {row["name"] for row in cur.fetchall()}
+    cols = {row["name"] for row in con.execute(f"PRAGMA table_info({table})")}
     if col not in cols:
-        cur.execute(f"ALTER TABLE {table} ADD COLUMN {col} {coltype}")
+        con.execute(f"ALTER TABLE {table} ADD COLUMN {col} {coltype}")
         con.commit()
 
 
 # ---------------- Users ----------------
 
-def upsert_user(con: sqlite3.Connection, telegram_user_id: int, telegram_chat_id: int, name: str) -> int:
-    cur = con.cursor()
-    cur.execute("SELECT id FROM users WHERE telegram_user_id = ?", (telegram_user_id,))
-    row = cur.fetchone()
-    if row:
-        cur.execute(
-            "UPDATE users SET telegram_chat_id=?, name=? WHERE telegram_user_id=?",
-            (telegram_chat_id, name, telegram_user_id),
+SQL_UPSERT_USER = (
+    "INSERT INTO users(telegram_user_id, telegram_chat_id, name, created_at) VALUES(?,?,?,?) "
+    "ON CONFLICT(telegram_user_id) DO UPDATE SET telegram_chat_id=excluded.telegram_chat_id, name=excluded.name "
+    "RETURNING id"
+)
+SQL_GET_USER_ID = "SELECT id FROM users WHERE telegram_user_id=?"
+SQL_GET_USER_CHAT_ID = "SELECT telegram_chat_id FROM users WHERE id=?"
+
+# Cache en proceso (casi nunca cambian): telegram_user_id -> users.id, users.id -> chat_id.
+# upsert_user lo mantiene al dia.
+_USER_ID_CACHE: Dict[int, int] = {}
+_CHAT_ID_CACHE: Dict[int, int] = {}
+
+
+def clear_user_cache() -> None:
+    _USER_ID_CACHE.clear()
+    _CHAT_ID_CACHE.clear()
+
+
+def upsert_user(con: sqlite3.Connection, telegram_user_id: int, telegram_chat_id: int, name: str, now: Optional[str] = None) -> int:
+    # Un solo statement (UPSERT + RETURNING, SQLite >= 3.35): sin SELECT previo y atomico
+    with transaction(con):
+        cur = con.execute(
+            SQL_UPSERT_USER,
+            (telegram_user_id, telegram_chat_id, name, now or _now_iso()),
         )
-        con.commit()
-        return int(row["id"])
+        row = cur.fetchone()
+    user_id = int(row["id"])
+    _USER_ID_CACHE[telegram_user_id] = user_id
+    _CHAT_ID_CACHE[user_id] = telegram_chat_id
+    return user_id
 
-    cur.execute(
-        "INSERT INTO users(telegram_user_id, telegram_chat_id, name, created_at) VALUES(?,?,?,?)",
-        (telegram_user_id, telegram_chat_id, name, _now_iso()),
-    )
-    con.commit()
-    return int(cur.lastrowid)
+
+def cached_user_id(telegram_user_id: int) -> Optional[int]:
+    # Solo la cache en proceso (sin tocar la DB): para el camino rapido de los handlers async
+    return _USER_ID_CACHE.get(telegram_user_id)
+
+
+def ensure_user(con: sqlite3.Connection, telegram_user_id: int, telegram_chat_id: int, name: str) -> int:
+    """
+    users.id del usuario, creandolo si hace falta.
+    Cache primero; si no esta, un solo UPSERT ... RETURNING (sin SELECT previo).
+    """
+    cached = _USER_ID_CACHE.get(telegram_user_id)
+    if cached is not None:
+        return cached
+    return upsert_user(con, telegram_user_id, telegram_chat_id, name)
 
 
 def get_user_id(con: sqlite3.Connection, telegram_user_id: int) -> Optional[int]:
-    cur = con.cursor()
-    cur.execute("SELECT id FROM users WHERE telegram_user_id=?", (telegram_user_id,))
+    cached = _USER_ID_CACHE.get(telegram_user_id)
+    if cached is not None:
+        return cached
+
+    cur = con.execute(SQL_GET_USER_ID, (telegram_user_id,))
     row = cur.fetchone()
-    return int(row["id"]) if row else None
+    if not row:
+        return None
+    _USER_ID_CACHE[telegram_user_id] = int(row[0])
+    return int(row[0])
 
 
 def get_user_chat_id(con: sqlite3.Connection, user_id: int) -> Optional[int]:
-    cur = con.cursor()
-    cur.execute("SELECT telegram_chat_id FROM users WHERE id=?", (user_id,))
+    cached = _CHAT_ID_CACHE.get(user_id)
+    if cached is not None:
+        return cached
+
+    cur = con.execute(SQL_GET_USER_CHAT_ID, (user_id,))
     row = cur.fetchone()
-    return int(row["telegram_chat_id"]) if (row and row["telegram_chat_id"] is not None) else None
+    if not (row and row[0] is not None):
+        return None
+    _CHAT_ID_CACHE[user_id] = int(row[0])
+    return int(row[0])
 
 
 # ---------------- Notes ----------------
 
-def add_note(con: sqlite3.Connection, user_id: int, note_datetime: str, text: str, tags: str | None = None) -> int:
-    cur = con.cursor()
-    cur.execute(
-        "INSERT INTO notes(user_id, note_datetime, text, tags, created_at) VALUES(?,?,?,?,?)",
-        (user_id, note_datetime, text, tags, _now_iso()),
-    )
-    con.commit()
+SQL_ADD_NOTE = "INSERT INTO notes(user_id, note_datetime, text, tags, created_at) VALUES(?,?,?,?,?)"
+# Rango [dia, dia+1): usa idx_notes_user_dt (substr() sobre la columna obligaba a escanear)
+SQL_LIST_NOTES_BY_DATE = (
+    "SELECT * FROM notes WHERE user_id=? AND note_datetime>=? AND note_datetime<? ORDER BY note_datetime ASC"
+)
+# Tareas y notas en una sola consulta; src ('t'/'n') indica de que tabla viene cada fila
+_SEARCH_UNION = (
+    "SELECT 't' AS src, id, user_id, target_date AS d, text, status FROM tasks "
+    "WHERE user_id=? AND {tasks_match} "
+    "UNION ALL "
+    "SELECT 'n', id, user_id, note_datetime, text, NULL FROM notes "
+    "WHERE user_id=? AND {notes_match}"
+)
+_SEARCH_LIKE = _SEARCH_UNION.format(tasks_match="text LIKE ?", notes_match="text LIKE ?")
+_SEARCH_FTS = _SEARCH_UNION.format(
+    tasks_match="id IN (SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH ?)",
+    notes_match="id IN (SELECT rowid FROM notes_fts WHERE notes_fts MATCH ?)",
+)
+# Paginacion por keyset: la pagina siguiente arranca despues de (d, id) de la ultima fila
+_SEARCH_PAGE = "SELECT * FROM ({union}) {after}ORDER BY d DESC, id DESC LIMIT ?"
+_SEARCH_AFTER = "WHERE (d, id) < (?, ?) "
+
+SQL_SEARCH_ALL = _SEARCH_PAGE.format(union=_SEARCH_LIKE, after="")
+SQL_SEARCH_ALL_AFTER = _SEARCH_PAGE.format(union=_SEARCH_LIKE, after=_SEARCH_AFTER)
+SQL_SEARCH_ALL_FTS = _SEARCH_PAGE.format(union=_SEARCH_FTS, after="")
+SQL_SEARCH_ALL_FTS_AFTER = _SEARCH_PAGE.format(union=_SEARCH_FTS, after=_SEARCH_AFTER)
+
+# SQL de busqueda segun si hay cursor de pagina (clave: after is not None)
+_SEARCH_ALL_SQL = {False: SQL_SEARCH_ALL, True: SQL_SEARCH_ALL_AFTER}
+_SEARCH_ALL_FTS_SQL = {False: SQL_SEARCH_ALL_FTS, True: SQL_SEARCH_ALL_FTS_AFTER}
+
+SEARCH_PAGE_SIZE = 50
+
+# El tokenizer trigram solo encuentra textos de 3+ caracteres
+FTS_MIN_NEEDLE = 3
+
+
+def add_note(con: sqlite3.Connection, user_id: int, note_datetime: str, text: str, tags: str | None = None, now: Optional[str] = None) -> int:
+    with transaction(con):
+        cur = con.execute(
+            SQL_ADD_NOTE,
+            (user_id, note_datetime, text, tags, now or _now_iso()),
+        )
     return int(cur.lastrowid)
 
 
-def list_notes_by_date(con: sqlite3.Connection, user_id: int, yyyy_mm_dd: str) -> List[Dict[str, Any]]:
-    cur = con.cursor()
-    cur.execute(
-        "SELECT * FROM notes WHERE user_id=? AND substr(note_datetime,1,10)=? ORDER BY note_datetime ASC",
-        (user_id, yyyy_mm_dd),
-    )
-    return [dict(r) for r in cur.fetchall()]
-
+def add_notes_bulk(con: sqlite3.Connection, user_id: int, rows: Iterable[Tuple[str, str, Optional[str]]], now: Optional[str] = None) -> int:
+    """
+    rows: (note_datetime, text, tags). Un solo executemany dentro de una transaccion.
+    Retorna cuantas notas inserto.
+    """
+    now = now or _now_iso()
+    with transaction(con):
+        cur = con.executemany(
+            SQL_ADD_NOTE,
+            ((user_id, nd, text, tags, now) for nd, text, tags in rows),
+        )
+    return cur.rowcount
 
-def search_all(con: sqlite3.Connection, user_id: int, needle: str) -> Dict[str, List[Dict[str, Any]]]:
-    like = f"%{needle}%"
-    cur = con.cursor()
 
-    cur.execute(
-        "SELECT id, user_id, target_date, text, status FROM tasks WHERE user_id=? AND text LIKE ? ORDER BY target_date DESC, id DESC",
-        (user_id, like),
+def list_notes_by_date(con: sqlite3.Connection, user_id: int, yyyy_mm_dd: str) -> List[sqlite3.Row]:
+    next_day = (date.fromisoformat(yyyy_mm_dd) + timedelta(days=1)).isoformat()
+    cur = con.execute(
+        SQL_LIST_NOTES_BY_DATE,
+        (user_id, yyyy_mm_dd, next_day),
     )
-    tasks = [dict(r) for r in cur.fetchall()]
+    return cur.fetchall()
 
-    cur.execute(
-        "SELECT id, user_id, note_datetime, text FROM notes WHERE user_id=? AND text LIKE ? ORDER BY note_datetime DESC, id DESC",
-        (user_id, like),
-    )
-    notes = [dict(r) for r in cur.fetchall()]
 
-    return {"tasks": tasks, "notes": notes}
+def _fts_phrase(needle: str) -> str:
+    # Frase entre comillas: FTS5 no interpreta operadores (AND, OR, *, ...) del usuario
+    return '"' + needle.replace('"', '""') + '"'
 
 
-# ---------------- Tasks (nuevo robusto) ----------------
+def _split_search_rows(rows: List[Tuple[Any, ...]], limit: int) -> Dict[str, Any]:
+    tasks: List[Dict[str, Any]] = []
+    notes: List[Dict[str, Any]] = []
+    for src, rid, uid, d, text, status in rows:
+        if src == "t":
+            tasks.append({"id": rid, "user_id": uid, "target_date": d, "text": text, "status": status})
+        else:
+            notes.append({"id": rid, "user_id": uid, "note_datetime": d, "text": text})
+    # Pagina llena: puede haber mas, el token es (d, id) de la ultima fila
+    next_page = (rows[-1][3], rows[-1][1]) if len(rows) == limit else None
+    return {"tasks": tasks, "notes": notes, "next": next_page}
 
-def add_task(con: sqlite3.Connection, user_id: int, target_date: str, text: str) -> int:
-    cur = con.cursor()
-    cur.execute(
-        "INSERT INTO tasks(user_id, target_date, text, status, created_at) VALUES(?,?,?,?,?)",
-        (user_id, target_date, text, "pending", _now_iso()),
-    )
-    con.commit()
-    return int(cur.lastrowid)
 
+def search_all(con: sqlite3.Connection, user_id: int, needle: str, limit: int = SEARCH_PAGE_SIZE, after: Optional[Tuple[str, int]] = None) -> Dict[str, Any]:
+    """
+    Retorna {"tasks": [...], "notes": [...], "next": (d, id) | None}, a lo sumo `limit` filas
+    (mas recientes primero). Para la pagina siguiente: search_all(..., after=res["next"]).
+    """
+    paged = after is not None
+    page = (*after, limit) if paged else (limit,)
 
-def get_task_by_id(con: sqlite3.Connection, user_id: int, task_id: int) -> Optional[Dict[str, Any]]:
     cur = con.cursor()
-    cur.execute("SELECT * FROM tasks WHERE user_id=? AND id=?", (user_id, task_id))
-    row = cur.fetchone()
-    return dict(row) if row else None
+    cur.row_factory = None  # tuplas: se desempacan por posicion
 
+    if len(needle) >= FTS_MIN_NEEDLE:
+        phrase = _fts_phrase(needle)
+        try:
+            cur.execute(_SEARCH_ALL_FTS_SQL[paged], (user_id, phrase, user_id, phrase, *page))
+            return _split_search_rows(cur.fetchall(), limit)
+        except sqlite3.OperationalError:
+            # Sin FTS5 (SQLite viejo): seguimos con LIKE
+            pass
 
-def list_tasks_by_date(con: sqlite3.Connection, user_id: int, target_date: str, status: Optional[str] = None) -> List[Dict[str, Any]]:
-    cur = con.cursor()
-    if status:
-        cur.execute(
-            "SELECT * FROM tasks WHERE user_id=? AND target_date=? AND status=? ORDER BY id ASC",
-            (user_id, target_date, status),
+    like = f"%{needle}%"
+    cur.execute(_SEARCH_ALL_SQL[paged], (user_id, like, user_id, like, *page))
+    return _split_search_rows(cur.fetchall(), limit)
+
+
+# ---------------- Tasks (nuevo robusto) ----------------
+# Los list_* retornan sqlite3.Row (acceso t["text"] como dict, pero sin copiar cada fila a un dict)
+
+SQL_ADD_TASK = "INSERT INTO tasks(user_id, target_date, text, status, created_at) VALUES(?,?,?,?,?)"
+SQL_GET_TASK = "SELECT * FROM tasks WHERE user_id=? AND id=?"
+SQL_LIST_TASKS_BY_DATE = "SELECT * FROM tasks WHERE user_id=? AND target_date=? ORDER BY id ASC"
+SQL_LIST_TASKS_BY_DATE_STATUS = "SELECT * FROM tasks WHERE user_id=? AND target_date=? AND status=? ORDER BY id ASC"
+SQL_LIST_TASKS_BETWEEN = (
+    "SELECT * FROM tasks WHERE user_id=? AND target_date>=? AND target_date<=? "
+    "ORDER BY target_date ASC, id ASC"
+)
+SQL_LIST_TASKS_BETWEEN_STATUS = (
+    "SELECT * FROM tasks WHERE user_id=? AND target_date>=? AND target_date<=? AND status=? "
+    "ORDER BY target_date ASC, id ASC"
+)
+SQL_LIST_TASKS_GLOBAL = "SELECT * FROM tasks WHERE user_id=? ORDER BY target_date DESC, id DESC"
+SQL_LIST_TASKS_GLOBAL_STATUS = "SELECT * FROM tasks WHERE user_id=? AND status=? ORDER BY target_date DESC, id DESC"
+SQL_MARK_TASK_DONE = "UPDATE tasks SET status='done', done_at=?, updated_at=? WHERE user_id=? AND id=? AND status!='done'"
+SQL_UPDATE_TASK_TEXT = "UPDATE tasks SET text=?, updated_at=? WHERE user_id=? AND id=?"
+SQL_UPDATE_TASK_DATE = "UPDATE tasks SET target_date=?, updated_at=? WHERE user_id=? AND id=?"
+SQL_UPDATE_TASK_DATE_TEXT = "UPDATE tasks SET target_date=?, text=?, updated_at=? WHERE user_id=? AND id=?"
+SQL_DELETE_TASK = "DELETE FROM tasks WHERE user_id=? AND id=?"
+SQL_MARK_TASKS_MISSED = (
+    "UPDATE tasks SET status='missed', missed_at=?, updated_at=? "
+    "WHERE user_id=? AND target_date=? AND status='pending'"
+)
+
+
+def add_task(con: sqlite3.Connection, user_id: int, target_date: str, text: str, now: Optional[str] = None) -> int:
+    with transaction(con):
+        cur = con.execute(
+            SQL_ADD_TASK,
+            (user_id, target_date, text, "pending", now or _now_iso()),
         )
-    else:
-        cur.execute(
-            "SELECT * FROM tasks WHERE user_id=? AND target_date=? ORDER BY id ASC",
-            (user_id, target_date),
+    return int(cur.lastrowid)
+
+
+def add_tasks_bulk(con: sqlite3.Connection, user_id: int, rows: Iterable[Tuple[str, str]], now: Optional[str] = None) -> int:
+    """
+    rows: (target_date, text). Un solo executemany dentro de una transaccion.
+    Retorna cuantas tareas inserto.
+    """
+    now = now or _now_iso()
+    with transaction(con):
+        cur = con.executemany(
+            SQL_ADD_TASK,
+            ((user_id, td, text, "pending", now) for td, text in rows),
         )
-    return [dict(r) for r in cur.fetchall()]
+    return cur.rowcount
 
 
-def list_tasks_between(con: sqlite3.Connection, user_id: int, start_date: str, end_date: str, status: Optional[str] = None) -> List[Dict[str, Any]]:
-    cur = con.cursor()
+def get_task_by_id(con: sqlite3.Connection, user_id: int, task_id: int) -> Optional[sqlite3.Row]:
+    return con.execute(SQL_GET_TASK, (user_id, task_id)).fetchone()
+
+
+def list_tasks_by_date(con: sqlite3.Connection, user_id: int, target_date: str, status: Optional[str] = None) -> List[sqlite3.Row]:
     if status:
-        cur.execute(
-            "SELECT * FROM tasks WHERE user_id=? AND target_date>=? AND target_date<=? AND status=? ORDER BY target_date ASC, id ASC",
-            (user_id, start_date, end_date, status),
-        )
-    else:
-        cur.execute(
-            "SELECT * FROM tasks WHERE user_id=? AND target_date>=? AND target_date<=? ORDER BY target_date ASC, id ASC",
-            (user_id, start_date, end_date),
-        )
-    return [dict(r) for r in cur.fetchall()]
+        return con.execute(SQL_LIST_TASKS_BY_DATE_STATUS, (user_id, target_date, status)).fetchall()
+    return con.execute(SQL_LIST_TASKS_BY_DATE, (user_id, target_date)).fetchall()
 
 
-def list_tasks_global(con: sqlite3.Connection, user_id: int, status: Optional[str] = None) -> List[Dict[str, Any]]:
-    cur = con.cursor()
+def list_tasks_between(con: sqlite3.Connection, user_id: int, start_date: str, end_date: str, status: Optional[str] = None) -> List[sqlite3.Row]:
     if status:
-        cur.execute(
-            "SELECT * FROM tasks WHERE user_id=? AND status=? ORDER BY target_date DESC, id DESC",
-            (user_id, status),
-        )
-    else:
-        cur.execute(
-            "SELECT * FROM tasks WHERE user_id=? ORDER BY target_date DESC, id DESC",
-            (user_id,),
-        )
-    return [dict(r) for r in cur.fetchall()]
+        return con.execute(SQL_LIST_TASKS_BETWEEN_STATUS, (user_id, start_date, end_date, status)).fetchall()
+    return con.execute(SQL_LIST_TASKS_BETWEEN, (user_id, start_date, end_date)).fetchall()
 
 
-def mark_task_done_by_id(con: sqlite3.Connection, user_id: int, task_id: int) -> bool:
-    now = _now_iso()
-    cur = con.cursor()
-    cur.execute(
-        "UPDATE tasks SET status='done', done_at=?, updated_at=? WHERE user_id=? AND id=? AND status!='done'",
-        (now, now, user_id, task_id),
-    )
-    con.commit()
+def list_tasks_global(con: sqlite3.Connection, user_id: int, status: Optional[str] = None) -> List[sqlite3.Row]:
+    if status:
+        return con.execute(SQL_LIST_TASKS_GLOBAL_STATUS, (user_id, status)).fetchall()
+    return con.execute(SQL_LIST_TASKS_GLOBAL, (user_id,)).fetchall()
+
+
+def mark_task_done_by_id(con: sqlite3.Connection, user_id: int, task_id: int, now: Optional[str] = None) -> bool:
+    now = now or _now_iso()
+    with transaction(con):
+        cur = con.execute(
+            SQL_MARK_TASK_DONE,
+            (now, now, user_id, task_id),
+        )
     return cur.rowcount > 0
 
 
-def mark_task_done_by_text(con: sqlite3.Connection, user_id: int, text: str, target_date: Optional[str] = None) -> Tuple[str, List[int]]:
+def mark_task_done_by_text(con: sqlite3.Connection, user_id: int, text: str, target_date: Optional[str] = None, now: Optional[str] = None) -> Tuple[str, List[int]]:
     """
     Retorna (status, ids)
     status: 'none' | 'one' | 'many'
+    Caso normal (una sola coincidencia): un unico UPDATE ... RETURNING.
     """
-    cur = con.cursor()
-    params = [user_id]
-    q = "SELECT id FROM tasks WHERE user_id=? AND status='pending' AND text=?"
-    params.append(text)
+    now = now or _now_iso()
+    pred = "user_id=? AND status='pending' AND text=?"
+    params = [user_id, text]
 
     if target_date:
-        q += " AND target_date=?"
+        pred += " AND target_date=?"
         params.append(target_date)
 
-    q += " ORDER BY id ASC"
-    cur.execute(q, tuple(params))
-    ids = [int(r["id"]) for r in cur.fetchall()]
-
-    if not ids:
-        return ("none", [])
-    if len(ids) > 1:
-        return ("many", ids)
-
-    # exacto uno
-    ok = mark_task_done_by_id(con, user_id, ids[0])
-    return ("one", [ids[0]] if ok else [])
-
-
-def update_task_text(con: sqlite3.Connection, user_id: int, task_id: int, new_text: str) -> bool:
-    now = _now_iso()
-    cur = con.cursor()
-    cur.execute(
-        "UPDATE tasks SET text=?, updated_at=? WHERE user_id=? AND id=?",
-        (new_text, now, user_id, task_id),
-    )
-    con.commit()
+    with transaction(con):
+        cur = con.cursor()
+        cur.row_factory = None
+        # Solo actualiza si hay exactamente una pendiente que coincide (CASE devuelve NULL si hay 0 o varias)
+        cur.execute(
+            "UPDATE tasks SET status='done', done_at=?, updated_at=? "
+            f"WHERE id=(SELECT CASE WHEN COUNT(*)=1 THEN MIN(id) END FROM tasks WHERE {pred}) "
+            "RETURNING id",
+            (now, now, *params),
+        )
+        done = [r[0] for r in cur.fetchall()]
+    if done:
+        return ("one", done)
+
+    # Nada actualizado: distinguir 'none' de 'many'
+    cur.execute(f"SELECT id FROM tasks WHERE {pred} ORDER BY id ASC", tuple(params))
+    ids = [r[0] for r in cur]
+    return ("many", ids) if ids else ("none", [])
+
+
+def update_task_text(con: sqlite3.Connection, user_id: int, task_id: int, new_text: str, now: Optional[str] = None) -> bool:
+    now = now or _now_iso()
+    with transaction(con):
+        cur = con.execute(
+            SQL_UPDATE_TASK_TEXT,
+            (new_text, now, user_id, task_id),
+        )
     return cur.rowcount > 0
 
 
-def update_task_date(con: sqlite3.Connection, user_id: int, task_id: int, new_date: str) -> bool:
-    now = _now_iso()
-    cur = con.cursor()
-    cur.execute(
-        "UPDATE tasks SET target_date=?, updated_at=? WHERE user_id=? AND id=?",
-        (new_date, now, user_id, task_id),
-    )
-    con.commit()
+def update_task_date(con: sqlite3.Connection, user_id: int, task_id: int, new_date: str, now: Optional[str] = None) -> bool:
+    now = now or _now_iso()
+    with transaction(con):
+        cur = con.execute(
+            SQL_UPDATE_TASK_DATE,
+            (new_date, now, user_id, task_id),
+        )
     return cur.rowcount > 0
 
 
-def update_task_date_text(con: sqlite3.Connection, user_id: int, task_id: int, new_date: str, new_text: str) -> bool:
-    now = _now_iso()
-    cur = con.cursor()
-    cur.execute(
-        "UPDATE tasks SET target_date=?, text=?, updated_at=? WHERE user_id=? AND id=?",
-        (new_date, new_text, now, user_id, task_id),
-    )
-    con.commit()
+def update_task_date_text(con: sqlite3.Connection, user_id: int, task_id: int, new_date: str, new_text: str, now: Optional[str] = None) -> bool:
+    now = now or _now_iso()
+    with transaction(con):
+        cur = con.execute(
+            SQL_UPDATE_TASK_DATE_TEXT,
+            (new_date, new_text, now, user_id, task_id),
+        )
     return cur.rowcount > 0
 
 
 def delete_task_by_id(con: sqlite3.Connection, user_id: int, task_id: int) -> bool:
-    cur = con.cursor()
-    cur.execute("DELETE FROM tasks WHERE user_id=? AND id=?", (user_id, task_id))
-    con.commit()
+    with transaction(con):
+        cur = con.execute(SQL_DELETE_TASK, (user_id, task_id))
     return cur.rowcount > 0
 
 
-def mark_tasks_missed_for_date(con: sqlite3.Connection, user_id: int, target_date: str) -> int:
+def mark_tasks_missed_for_date(con: sqlite3.Connection, user_id: int, target_date: str, now: Optional[str] = None) -> int:
     """
     pending -> missed para el día dado. Retorna cuántas cambió.
     """
-    now = _now_iso()
-    cur = con.cursor()
-    cur.execute(
-        "UPDATE tasks SET status='missed', missed_at=?, updated_at=? WHERE user_id=? AND target_date=? AND status='pending'",
-        (now, now, user_id, target_date),
-    )
-    con.commit()
+    now = now or _now_iso()
+    with transaction(con):
+        cur = con.execute(
+            SQL_MARK_TASKS_MISSED,
+            (now, now, user_id, target_date),
+        )
     return cur.rowcount
 
 
 # ---------------- Reminders DB (para no romper tu proyecto) ----------------
 
-def create_reminder(con: sqlite3.Connection, user_id: int, name: str, message: str, schedule: str, timezone: str = "America/Bogota") -> int:
+SQL_CREATE_REMINDER = (
+    "INSERT INTO reminders(user_id, name, message, schedule, timezone, active, created_at) VALUES(?,?,?,?,?,?,?)"
+)
+# Columnas explicitas en vez de SELECT *: el orden de las tuplas queda fijo
+REMINDER_COLUMNS = "id, user_id, name, message, schedule, timezone, active, last_run_at, next_run_at, created_at"
+
+SQL_GET_REMINDER = f"SELECT {REMINDER_COLUMNS} FROM reminders WHERE user_id=? AND id=?"
+SQL_GET_REMINDER_BY_ID = f"SELECT {REMINDER_COLUMNS} FROM reminders WHERE id=?"
+SQL_GET_REMINDER_ACTIVE = "SELECT active FROM reminders WHERE id=?"
+SQL_LIST_REMINDERS = f"SELECT {REMINDER_COLUMNS} FROM reminders WHERE user_id=? ORDER BY id ASC"
+SQL_LIST_REMINDERS_ACTIVE = f"SELECT {REMINDER_COLUMNS} FROM reminders WHERE user_id=? AND active=1 ORDER BY id ASC"
+SQL_UPDATE_REMINDER_ACTIVE = "UPDATE reminders SET active=? WHERE user_id=? AND id=?"
+SQL_ACTIVATE_REMINDER = f"UPDATE reminders SET active=1 WHERE user_id=? AND id=? RETURNING {REMINDER_COLUMNS}"
+SQL_DEACTIVATE_REMINDER_BY_ID = "UPDATE reminders SET active=0 WHERE id=?"
+SQL_DELETE_REMINDER = "DELETE FROM reminders WHERE user_id=? AND id=?"
+SQL_UPDATE_REMINDER_RUN_TIMES = "UPDATE reminders SET last_run_at=?, next_run_at=? WHERE id=?"
+SQL_FINISH_ONCE_REMINDER = "UPDATE reminders SET active=0, last_run_at=?, next_run_at=NULL WHERE user_id=? AND id=?"
+# Arranque: activos de todos los usuarios con su chat_id en una sola consulta (sin N+1)
+SQL_ACTIVE_REMINDERS_WITH_CHAT = (
+    "SELECT r.id, r.user_id, r.name, r.message, r.schedule, r.timezone, r.active, "
+    "r.last_run_at, r.next_run_at, r.created_at, u.telegram_chat_id AS chat_id "
+    "FROM reminders r JOIN users u ON u.id = r.user_id "
+    "WHERE r.active=1 AND u.telegram_chat_id IS NOT NULL ORDER BY r.id ASC"
+)
+
+
+def create_reminder(con: sqlite3.Connection, user_id: int, name: str, message: str, schedule: str, timezone: str = "America/Bogota", now: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Retorna el recordatorio creado (mismas claves que get_reminder) sin volver a leerlo de la DB.
+    """
+    now = now or _now_iso()
+    with transaction(con):
+        cur = con.execute(
+            SQL_CREATE_REMINDER,
+            (user_id, name, message, schedule, timezone, 1, now),
+        )
+    return {
+        "id": int(cur.lastrowid),
+        "user_id": user_id,
+        "name": name,
+        "message": message,
+        "schedule": schedule,
+        "timezone": timezone,
+        "active": 1,
+        "last_run_at": None,
+        "next_run_at": None,
+        "created_at": now,
+    }
+
+
+def create_reminders_bulk(con: sqlite3.Connection, user_id: int, rows: Iterable[Tuple[str, str, str, str]], now: Optional[str] = None) -> int:
+    """
+    rows: (name, message, schedule, timezone). Un solo executemany dentro de una transaccion.
+    Retorna cuantos recordatorios inserto.
+    """
+    now = now or _now_iso()
+    with transaction(con):
+        cur = con.executemany(
+            SQL_CREATE_REMINDER,
+            ((user_id, name, message, schedule, tz, 1, now) for name, message, schedule, tz in rows),
+        )
+    return cur.rowcount
+
+
+def _rows_to_dicts(cur: sqlite3.Cursor) -> List[Dict[str, Any]]:
+    # Nombres de columna una sola vez por consulta (dict(Row) los recorre en cada fila)
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur]
+
+
+def _reminder_cursor(con: sqlite3.Connection) -> sqlite3.Cursor:
     cur = con.cursor()
-    cur.execute(
-        "INSERT INTO reminders(user_id, name, message, schedule, timezone, active, created_at) VALUES(?,?,?,?,?,?,?)",
-        (user_id, name, message, schedule, timezone, 1, _now_iso()),
-    )
-    con.commit()
-    return int(cur.lastrowid)
+    cur.row_factory = None
+    return cur
 
 
 def get_reminder(con: sqlite3.Connection, user_id: int, reminder_id: int) -> Optional[Dict[str, Any]]:
-    cur = con.cursor()
-    cur.execute("SELECT * FROM reminders WHERE user_id=? AND id=?", (user_id, reminder_id))
-    row = cur.fetchone()
-    return dict(row) if row else None
+    cur = _reminder_cursor(con)
+    cur.execute(SQL_GET_REMINDER, (user_id, reminder_id))
+    rows = _rows_to_dicts(cur)
+    return rows[0] if rows else None
 
 
 def get_reminder_by_id(con: sqlite3.Connection, reminder_id: int) -> Optional[Dict[str, Any]]:
-    cur = con.cursor()
-    cur.execute("SELECT * FROM reminders WHERE id=?", (reminder_id,))
-    row = cur.fetchone()
-    return dict(row) if row else None
+    cur = _reminder_cursor(con)
+    cur.execute(SQL_GET_REMINDER_BY_ID, (reminder_id,))
+    rows = _rows_to_dicts(cur)
+    return rows[0] if rows else None
+
+
+def get_reminder_active_flag(con: sqlite3.Connection, reminder_id: int) -> Optional[bool]:
+    """
+    Solo el flag active (para cada disparo). None si el recordatorio ya no existe.
+    """
+    cur = _reminder_cursor(con)
+    row = cur.execute(SQL_GET_REMINDER_ACTIVE, (reminder_id,)).fetchone()
+    return None if row is None else int(row[0]) == 1
 
 
 def list_reminders(con: sqlite3.Connection, user_id: int, only_active: bool = True) -> List[Dict[str, Any]]:
-    cur = con.cursor()
+    cur = _reminder_cursor(con)
     if only_active:
-        cur.execute("SELECT * FROM reminders WHERE user_id=? AND active=1 ORDER BY id ASC", (user_id,))
+        cur.execute(SQL_LIST_REMINDERS_ACTIVE, (user_id,))
     else:
-        cur.execute("SELECT * FROM reminders WHERE user_id=? ORDER BY id ASC", (user_id,))
-    return [dict(r) for r in cur.fetchall()]
+        cur.execute(SQL_LIST_REMINDERS, (user_id,))
+    return _rows_to_dicts(cur)
+
+
+def iter_active_reminders_with_chat(con: sqlite3.Connection) -> Iterator[sqlite3.Row]:
+    """
+    Recordatorios activos (mismas claves que get_reminder) + chat_id del usuario.
+    Se omiten los usuarios sin chat_id. Filas sqlite3.Row tal cual salen del cursor (sin copiar a dict).
+    """
+    return con.execute(SQL_ACTIVE_REMINDERS_WITH_CHAT)
 
 
 def update_reminder_active(con: sqlite3.Connection, user_id: int, reminder_id: int, active: int) -> bool:
-    cur = con.cursor()
-    cur.execute("UPDATE reminders SET active=? WHERE user_id=? AND id=?", (active, user_id, reminder_id))
-    con.commit()
+    with transaction(con):
+        cur = con.execute(SQL_UPDATE_REMINDER_ACTIVE, (active, user_id, reminder_id))
     return cur.rowcount > 0
 
 
+def activate_reminder(con: sqlite3.Connection, user_id: int, reminder_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Activa y retorna el recordatorio (mismas claves que get_reminder) en un solo UPDATE ... RETURNING.
+    None si no existe para ese usuario.
+    """
+    with transaction(con):
+        cur = _reminder_cursor(con)
+        cur.execute(SQL_ACTIVATE_REMINDER, (user_id, reminder_id))
+        rows = _rows_to_dicts(cur)
+    return rows[0] if rows else None
+
+
 def delete_reminder(con: sqlite3.Connection, user_id: int, reminder_id: int) -> bool:
-    cur = con.cursor()
-    cur.execute("DELETE FROM reminders WHERE user_id=? AND id=?", (user_id, reminder_id))
-    con.commit()
+    with transaction(con):
+        cur = con.execute(SQL_DELETE_REMINDER, (user_id, reminder_id))
     return cur.rowcount > 0
 
 
 def update_reminder_run_times(con: sqlite3.Connection, reminder_id: int, last_run_at: Optional[str], next_run_at: Optional[str]) -> None:
-    cur = con.cursor()
-    cur.execute(
-        "UPDATE reminders SET last_run_at=?, next_run_at=? WHERE id=?",
-        (last_run_at, next_run_at, reminder_id),
-    )
-    con.commit()
+    with transaction(con):
+        con.execute(SQL_UPDATE_REMINDER_RUN_TIMES, (last_run_at, next_run_at, reminder_id))
+
+
+def finish_once_reminder(con: sqlite3.Connection, user_id: int, reminder_id: int, last_run_at: str) -> bool:
+    """
+    ONCE ya disparado: desactiva y guarda last_run_at en un solo UPDATE (un commit).
+    """
+    with transaction(con):
+        cur = con.execute(SQL_FINISH_ONCE_REMINDER, (last_run_at, user_id, reminder_id))
+    return cur.rowcount > 0
+
+
+def deactivate_reminders(con: sqlite3.Connection, reminder_ids: Iterable[int]) -> None:
+    """
+    active = 0 para varios recordatorios (ONCE vencidos al arrancar): un executemany, un commit.
+    """
+    with transaction(con):
+        con.executemany(SQL_DEACTIVATE_REMINDER_BY_ID, ((rid,) for rid in reminder_ids))
+
+
+def clear_reminder_run_times(con: sqlite3.Connection, reminder_ids: Iterable[int]) -> None:
+    """
+    last_run_at/next_run_at = NULL para varios recordatorios: un executemany, un commit.
+    """
+    with transaction(con):
+        con.executemany(SQL_UPDATE_REMINDER_RUN_TIMES, ((None, None, rid) for rid in reminder_ids))
+
+
+# ---------------- Export ----------------
+
+SQL_EXPORT_TASKS = "SELECT * FROM tasks WHERE user_id=? ORDER BY id DESC"
+SQL_EXPORT_NOTES = "SELECT * FROM notes WHERE user_id=? ORDER BY note_datetime DESC"
+
+
+def fetch_all_for_export(con: sqlite3.Connection, user_id: int) -> Tuple[Iterator[sqlite3.Row], Iterator[sqlite3.Row]]:
+    """
+    Retorna (tareas, notas) como cursores: se consumen fila a fila, sin cargar todo en memoria.
+    """
+    cur_t = con.execute(SQL_EXPORT_TASKS, (user_id,))
+    cur_n = con.execute(SQL_EXPORT_NOTES, (user_id,))
+    return cur_t, cur_n
@@ -1,34 +1,42 @@
 from __future__ import annotations
 
 import csv
-from pathlib import Path
-from tempfile import NamedTemporaryFile
+import io
 from typing import Tuple
 
 import db as dbmod
 
 
-def export_user_data_to_csv(con, user_id: int) -> Tuple[str, str]:
+def export_user_data_to_csv(db_path, user_id: int) -> Tuple[io.BytesIO, str]:
     """
-    Retorna (filepath, filename)
+    Retorna (buf, filename): el CSV en memoria, listo para reply_document.
+    Abre su propia conexion de solo lectura: se puede correr en un hilo aparte
+    (asyncio.to_thread) sin bloquear el loop ni a la conexion de escritura.
     """
-    # Sacar tareas y notas
-    cur = con.cursor()
-    cur.execute("SELECT * FROM tasks WHERE user_id=? ORDER BY id DESC", (user_id,))
-    tasks = [dict(r) for r in cur.fetchall()]
+    con = dbmod.connect_readonly(db_path)
+    buf = io.BytesIO()
+    try:
+        # Tareas y notas como cursores: se escriben fila a fila
+        tasks, notes = dbmod.fetch_all_for_export(con, user_id)
+
+        # El csv escribe texto: se codifica a UTF-8 directo sobre el buffer, sin archivo temporal
+        out = io.TextIOWrapper(buf, encoding="utf-8", newline="")
+        writer = csv.writer(out)
+
+        writer.writerow(("TYPE", "DATE", "TEXT", "STATUS", "CREATED_AT", "DONE_AT", "NOTE_DATETIME"))
+        # writerows con generadores: el loop por fila queda dentro del modulo csv (C)
+        writer.writerows(
+            ("TASK", t["target_date"], t["text"], t["status"], t["created_at"], t["done_at"], "") for t in tasks
+        )
+        writer.writerows(
+            ("NOTE", n["note_datetime"][:10], n["text"], "", n["created_at"], "", n["note_datetime"]) for n in notes
+        )
+        out.flush()
+        # detach: cerrar el wrapper no debe cerrar el BytesIO
+        out.detach()
+    finally:
+        con.close()
 
-    cur.execute("SELECT * FROM notes WHERE user_id=? ORDER BY note_datetime DESC", (user_id,))
-    notes = [dict(r) for r in cur.fetchall()]
-
-    tmp = NamedTemporaryFile(delete=False, suffix=".csv", mode="w", newline="", encoding="utf-8")
-    writer = csv.writer(tmp)
-
-    writer.writerow(["TYPE", "DATE", "TEXT", "STATUS", "CREATED_AT", "DONE_AT", "NOTE_DATETIME"])
-    for t in tasks:
-        writer.writerow(["TASK", t["target_date"], t["text"], t["status"], t["created_at"], t.get("done_at"), ""])
-    for n in notes:
-        writer.writerow(["NOTE", n["note_datetime"][:10], n["text"], "", n["created_at"], "", n["note_datetime"]])
-
-    tmp.close()
     filename = "export_asistente.csv"
-    return tmp.name, filename
+    buf.seek(0)
+    return buf, filename
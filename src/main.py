@@ -1,12 +1,20 @@
 from __future__ import annotations
 
 import asyncio
+import io
 import logging
 import re
+import sqlite3
+from dataclasses import dataclass
 from datetime import datetime, timedelta, date, time, timezone
+from functools import cached_property, lru_cache, partial
+from itertools import groupby
+from time import time as _unix_time
+from typing import Awaitable, Callable, Optional
 
 from telegram import Update
 from telegram.ext import (
+    Application,
     ApplicationBuilder,
     CommandHandler,
     MessageHandler,
@@ -15,12 +23,10 @@ from telegram.ext import (
     filters,
 )
 
-# Tu reminders.py sigue igual
-import reminders as remmod
-
+# reminders (APScheduler) se importa dentro de los handlers que lo usan:
+# `import main` no arrastra el scheduler (sys.modules lo cachea tras el primer uso)
 import db as dbmod
-from config import get_settings
-from export_csv import export_user_data_to_csv
+from config import Settings, get_settings
 
 log = logging.getLogger("cortana")
 
@@ -29,13 +35,65 @@ logging.basicConfig(
     level=logging.INFO,
 )
 
+# Un solo bot por proceso: main() fija la conexion RW y los settings una vez
+# y los handlers los leen directo (sin pasar por context.application.bot_data)
+_CON: Optional[sqlite3.Connection] = None
+_SETTINGS: Optional[Settings] = None
+_OWNER_ID: int = 0
+
+# Limite de Telegram por mensaje (caracteres)
+_TG_MAX_TEXT = 4096
+
 # Termux-friendly: Bogotá es UTC-5 fijo (sin DST)
 BOGOTA_TZ = timezone(timedelta(hours=-5))
 
+# Patrones de handle_text, compilados una vez al cargar el modulo
+_RE_HICE = re.compile(r"^hice\s+#(\d+)\s*$")
+_RE_BORRAR = re.compile(r"^borrar\s+#(\d+)\s*$")
+_RE_MOVER = re.compile(r"^mover\s+#(\d+)\s*$")
+_RE_EDITAR = re.compile(r"^editar\s+#(\d+)\s*$")
+_RE_TAREAS_DATE = re.compile(r"^tareas:\s*(\d{4}-\d{2}-\d{2})$")
+_RE_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
 
-def is_owner(update: Update, owner_id: int) -> bool:
+
+def is_owner(update: Update) -> bool:
     u = update.effective_user
-    return bool(u and u.id == owner_id)
+    return u is not None and u.id == _OWNER_ID
+
+
+# ---------------- DB fuera del event loop ----------------
+# Los helpers de dbmod son sincronos: se corren en el pool de hilos (asyncio.to_thread)
+# para que una consulta lenta o un lock de WAL no frene al resto de updates.
+# Las escrituras usan la conexion RW compartida: cada helper de escritura abre
+# db.transaction, cuyo lock (threading.RLock) las serializa para todos los que escriben
+# (handlers, jobs y el arranque), sin lock aparte en el loop. Las lecturas usan la
+# conexion de solo lectura del hilo que las corre.
+
+
+def _with_reader(fn, *args, **kwargs):
+    return fn(dbmod.get_read_connection(_SETTINGS.db_path), *args, **kwargs)
+
+
+async def _db_read(fn, *args, **kwargs):
+    """
+    fn(con_ro, *args) en un hilo del pool.
+    """
+    return await asyncio.to_thread(_with_reader, fn, *args, **kwargs)
+
+
+async def _db_write(fn, *args, **kwargs):
+    """
+    fn(con_rw, *args) en un hilo del pool.
+    """
+    return await asyncio.to_thread(fn, _CON, *args, **kwargs)
+
+
+async def _get_user_id(telegram_user_id: int) -> Optional[int]:
+    # Caso normal: ya esta en la cache en proceso, sin saltar a un hilo
+    cached = dbmod.cached_user_id(telegram_user_id)
+    if cached is not None:
+        return cached
+    return await _db_read(dbmod.get_user_id, telegram_user_id)
 
 
 async def on_error(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -43,17 +101,31 @@ async def on_error(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 
 async def post_init(app):
-    # Guardamos el loop REAL donde corre el bot (para reminders + termux)
-    app.bot_data["loop"] = asyncio.get_running_loop()
+    loop = asyncio.get_running_loop()
+
+    # Programar cierre del día (tareas pending -> missed)
+    schedule_close_day(app)
+
+    # Recordatorios existentes: la lectura/escritura de la DB corre en un hilo aparte, pero
+    # se espera aqui. post_init corre antes de que app.start() arranque el scheduler, asi
+    # todos los add_job quedan pendientes y start() los procesa; un add_job desde otro hilo
+    # mientras start() esta en curso se podria perder.
+    await loop.run_in_executor(None, _schedule_existing_reminders, app)
+
+
+def _schedule_existing_reminders(app) -> None:
+    import reminders as remmod
+
+    try:
+        remmod.schedule_all_active(app, _SETTINGS.db_path)
+    except Exception as e:
+        log.warning("No pude programar recordatorios al inicio: %s", e)
 
 
 # ---------------- START ----------------
 
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings = context.application.bot_data["settings"]
-    con = context.application.bot_data["db"]
-
-    if not is_owner(update, settings.owner_telegram_user_id):
+    if not is_owner(update):
         await update.message.reply_text("Este bot es privado.")
         return
 
@@ -61,7 +133,7 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat = update.effective_chat
     name = (user.full_name or "Juan David").strip()
 
-    dbmod.upsert_user(con, user.id, chat.id, name)
+    await _db_write(dbmod.upsert_user, user.id, chat.id, name)
 
     await update.message.reply_text(
         "✅ Lista, Juan David. Ya estoy conectada a este chat.\n\n"
@@ -88,34 +160,55 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 # ---------------- EXPORT ----------------
 
-async def cmd_export(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings = context.application.bot_data["settings"]
-    con = context.application.bot_data["db"]
+def _build_export(db_path, user_id: int) -> tuple[io.BytesIO, str]:
+    # Corre en un hilo: el CSV se arma en memoria, sin pasar por disco
+    # Import diferido: el export es raro y no tiene por que pesar en el arranque
+    from export_csv import export_user_data_to_csv
 
-    if not is_owner(update, settings.owner_telegram_user_id):
-        return
+    return export_user_data_to_csv(db_path, user_id)
+
+
+async def cmd_export(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    settings = _SETTINGS
 
     user = update.effective_user
-    user_id = dbmod.get_user_id(con, user.id)
+    user_id = await _get_user_id(user.id)
     if not user_id:
         await update.message.reply_text("Primero usa /start.")
         return
 
-    filepath, filename = export_user_data_to_csv(con, user_id)
-    await update.message.reply_document(document=open(filepath, "rb"), filename=filename)
+    # En un hilo aparte con su propia conexion RO: el bot sigue respondiendo mientras exporta
+    buf, filename = await asyncio.to_thread(_build_export, settings.db_path, user_id)
+    await update.message.reply_document(document=buf, filename=filename)
 
 
 # ---------------- Helpers (Tareas) ----------------
 
+# (hoy, hoy_iso, mañana_iso, medianoche_unix): se recalcula solo al cambiar el dia en Bogotá
+_TODAY_CACHE: Optional[tuple[date, str, str, float]] = None
+
+
+def _today_strs() -> tuple[date, str, str, float]:
+    global _TODAY_CACHE
+    cache = _TODAY_CACHE
+    if cache is None or _unix_time() >= cache[3]:
+        # Bogotá por offset fijo
+        d = datetime.now(BOGOTA_TZ).date()
+        tomorrow = d + timedelta(days=1)
+        midnight = datetime.combine(tomorrow, time.min, BOGOTA_TZ).timestamp()
+        cache = _TODAY_CACHE = (d, d.isoformat(), tomorrow.isoformat(), midnight)
+    return cache
+
+
 def _today_iso() -> str:
-    # Bogotá por offset fijo
-    return datetime.now(BOGOTA_TZ).date().isoformat()
+    return _today_strs()[1]
 
 
 def _tomorrow_iso() -> str:
-    return (datetime.now(BOGOTA_TZ).date() + timedelta(days=1)).isoformat()
+    return _today_strs()[2]
 
 
+@lru_cache(maxsize=8)
 def _week_range(today: date) -> tuple[str, str]:
     # Lunes a domingo
     start = today - timedelta(days=today.weekday())
@@ -123,15 +216,35 @@ def _week_range(today: date) -> tuple[str, str]:
     return start.isoformat(), end.isoformat()
 
 
+def _after_colon(msg: str) -> str:
+    # "Pendiente: texto" -> "texto" (find + slice, sin armar una lista como split)
+    i = msg.find(":")
+    return msg[i + 1:].strip() if i >= 0 else ""
+
+
 def _fmt_task_line(t: dict) -> str:
     return f"#{t['id']} - {t['text']}"
 
 
-def _group_by_date(rows: list[dict]) -> dict[str, list[dict]]:
-    out: dict[str, list[dict]] = {}
-    for r in rows:
-        out.setdefault(r["target_date"], []).append(r)
-    return out
+def _join_capped(head: str, lines: list[str], limit: int = _TG_MAX_TEXT) -> str:
+    # Agrega lineas mientras quepan en un mensaje; el resto se resume en "… y X más"
+    out = [head]
+    size = len(head)
+    for i, line in enumerate(lines):
+        # Si quedan lineas despues de esta, tambien debe caber su resumen
+        rest = len(lines) - i - 1
+        need = 1 + len(line) + (len(f"\n… y {rest} más") if rest else 0)
+        if size + need > limit:
+            out.append(f"… y {len(lines) - i} más")
+            break
+        out.append(line)
+        size += 1 + len(line)
+    return "\n".join(out)
+
+
+def _task_date(t) -> str:
+    # key de groupby para filas ordenadas por fecha
+    return t["target_date"]
 
 
 # ---------------- Job: Cierre del día (missed) ----------------
@@ -142,21 +255,24 @@ async def job_close_day(context: ContextTypes.DEFAULT_TYPE) -> None:
     pending -> missed para el día actual.
     """
     app = context.application
-    con = app.bot_data["db"]
-    settings = app.bot_data["settings"]
 
     # Si no hay usuario creado aún, no hace nada
-    owner_user_id = dbmod.get_user_id(con, settings.owner_telegram_user_id)
+    owner_user_id = await _get_user_id(_OWNER_ID)
     if not owner_user_id:
         return
 
-    today = datetime.now(BOGOTA_TZ).date().isoformat()
-    changed = dbmod.mark_tasks_missed_for_date(con, owner_user_id, today)
+    today = _today_iso()
+    changed = await _db_write(dbmod.mark_tasks_missed_for_date, owner_user_id, today)
 
     # Notificar (si tenemos chat_id)
-    chat_id = dbmod.get_user_chat_id(con, owner_user_id)
+    chat_id = await _db_read(dbmod.get_user_chat_id, owner_user_id)
     if chat_id and changed > 0:
-        await app.bot.send_message(chat_id=chat_id, text=f"🌙 Cierre del día: {changed} tarea(s) quedaron incumplidas.")
+        # Resumen y detalle en un solo mensaje (una llamada a la API)
+        missed = await _db_read(dbmod.list_tasks_by_date, owner_user_id, today, status="missed")
+        text = _join_capped(
+            f"🌙 Cierre del día: {changed} tarea(s) quedaron incumplidas.", [_fmt_task_line(t) for t in missed]
+        )
+        await app.bot.send_message(chat_id=chat_id, text=text)
 
 
 def schedule_close_day(app) -> None:
@@ -173,18 +289,15 @@ def schedule_close_day(app) -> None:
 # (Si ya los tienes en tu main.py, puedes conservarlos igual)
 
 async def cmd_rem_add(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings = context.application.bot_data["settings"]
-    con = context.application.bot_data["db"]
-    app = context.application
+    import reminders as remmod
 
-    if not is_owner(update, settings.owner_telegram_user_id):
-        return
+    app = context.application
 
     user = update.effective_user
     chat = update.effective_chat
-    user_id = dbmod.get_user_id(con, user.id)
-    if not user_id:
-        user_id = dbmod.upsert_user(con, user.id, chat.id, user.full_name or "Juan David")
+    user_id = dbmod.cached_user_id(user.id) or await _db_write(
+        dbmod.ensure_user, user.id, chat.id, user.full_name or "Juan David"
+    )
 
     text = update.message.text or ""
     payload = text.replace("/rem_add", "", 1).strip()
@@ -202,8 +315,9 @@ async def cmd_rem_add(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         await update.message.reply_text("Uso: /rem_add <SCHEDULE> <NOMBRE> | <MENSAJE>")
         return
 
-    schedule = parts[0].strip()
-    name = " ".join(parts[1:]).strip()
+    # split() ya deja los tokens sin espacios
+    schedule = parts[0]
+    name = " ".join(parts[1:])
 
     try:
         remmod.parse_schedule(schedule)
@@ -211,27 +325,28 @@ async def cmd_rem_add(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         await update.message.reply_text(f"Schedule inválido: {e}")
         return
 
-    rid = dbmod.create_reminder(con, user_id, name=name, message=message, schedule=schedule, timezone="America/Bogota")
-    row = dbmod.get_reminder(con, user_id, rid)
-    remmod.schedule_one(app, con, row, chat.id)
+    row = await _db_write(
+        dbmod.create_reminder, user_id, name=name, message=message, schedule=schedule, timezone="America/Bogota"
+    )
+    if not remmod.schedule_one(app, _SETTINGS.db_path, row, chat.id):
+        # ONCE con fecha/hora ya pasada: queda guardado pero apagado
+        await _db_write(dbmod.update_reminder_active, user_id, row["id"], 0)
+        await update.message.reply_text(
+            f"⚠️ Esa fecha/hora ya pasó: el recordatorio (id={row['id']}) quedó guardado pero desactivado."
+        )
+        return
 
-    await update.message.reply_text(f"✅ Recordatorio creado (id={rid}).")
+    await update.message.reply_text(f"✅ Recordatorio creado (id={row['id']}).")
 
 
 async def cmd_rem_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings = context.application.bot_data["settings"]
-    con = context.application.bot_data["db"]
-
-    if not is_owner(update, settings.owner_telegram_user_id):
-        return
-
     user = update.effective_user
-    user_id = dbmod.get_user_id(con, user.id)
+    user_id = await _get_user_id(user.id)
     if not user_id:
         await update.message.reply_text("Primero usa /start.")
         return
 
-    reminders = dbmod.list_reminders(con, user_id, only_active=False)
+    reminders = await _db_read(dbmod.list_reminders, user_id, only_active=False)
     if not reminders:
         await update.message.reply_text("No tienes recordatorios aún. Usa /rem_add.")
         return
@@ -253,16 +368,13 @@ async def cmd_rem_on(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
 
 
 async def _rem_toggle(update: Update, context: ContextTypes.DEFAULT_TYPE, active: int) -> None:
-    settings = context.application.bot_data["settings"]
-    con = context.application.bot_data["db"]
-    app = context.application
+    import reminders as remmod
 
-    if not is_owner(update, settings.owner_telegram_user_id):
-        return
+    app = context.application
 
     user = update.effective_user
     chat = update.effective_chat
-    user_id = dbmod.get_user_id(con, user.id)
+    user_id = await _get_user_id(user.id)
     if not user_id:
         await update.message.reply_text("Primero usa /start.")
         return
@@ -273,30 +385,35 @@ async def _rem_toggle(update: Update, context: ContextTypes.DEFAULT_TYPE, active
 
     rid = int(context.args[0])
 
-    ok = dbmod.update_reminder_active(con, user_id, rid, active)
-    if not ok:
-        await update.message.reply_text("No encontré ese recordatorio.")
-        return
-
     if active == 1:
-        row = dbmod.get_reminder(con, user_id, rid)
-        remmod.schedule_one(app, con, row, chat.id)
+        # Activa y trae la fila en el mismo UPDATE: None si no existe
+        row = await _db_write(dbmod.activate_reminder, user_id, rid)
+        if row is None:
+            await update.message.reply_text("No encontré ese recordatorio.")
+            return
+        if not remmod.schedule_one(app, _SETTINGS.db_path, row, chat.id):
+            # ONCE vencido: no hay nada que programar, vuelve a quedar apagado
+            await _db_write(dbmod.update_reminder_active, user_id, rid, 0)
+            await update.message.reply_text("⚠️ La fecha/hora de ese recordatorio ya pasó: sigue desactivado.")
+            return
+        # Run times en NULL: se recalculan en el proximo disparo
+        await _db_write(dbmod.update_reminder_run_times, rid, last_run_at=None, next_run_at=None)
         await update.message.reply_text("✅ Activado.")
     else:
+        if not await _db_write(dbmod.update_reminder_active, user_id, rid, 0):
+            await update.message.reply_text("No encontré ese recordatorio.")
+            return
         remmod.unschedule_one(app, user_id, rid)
         await update.message.reply_text("🛑 Desactivado.")
 
 
 async def cmd_rem_del(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings = context.application.bot_data["settings"]
-    con = context.application.bot_data["db"]
-    app = context.application
+    import reminders as remmod
 
-    if not is_owner(update, settings.owner_telegram_user_id):
-        return
+    app = context.application
 
     user = update.effective_user
-    user_id = dbmod.get_user_id(con, user.id)
+    user_id = await _get_user_id(user.id)
     if not user_id:
         await update.message.reply_text("Primero usa /start.")
         return
@@ -308,315 +425,354 @@ async def cmd_rem_del(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     rid = int(context.args[0])
 
     remmod.unschedule_one(app, user_id, rid)
-    ok = dbmod.delete_reminder(con, user_id, rid)
+    ok = await _db_write(dbmod.delete_reminder, user_id, rid)
     await update.message.reply_text("🗑️ Eliminado." if ok else "No encontré ese recordatorio.")
 
 
 async def cmd_rem_test(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings = context.application.bot_data["settings"]
-    con = context.application.bot_data["db"]
-    app = context.application
+    import reminders as remmod
 
-    if not is_owner(update, settings.owner_telegram_user_id):
-        return
+    app = context.application
 
     user = update.effective_user
     chat = update.effective_chat
-    user_id = dbmod.get_user_id(con, user.id)
+    user_id = await _get_user_id(user.id)
     if not user_id:
         await update.message.reply_text("Primero usa /start.")
         return
 
     now = datetime.now(BOGOTA_TZ) + timedelta(minutes=2)
-    schedule = f"ONCE@{now.strftime('%Y-%m-%d')}@{now.strftime('%H:%M')}"
-    rid = dbmod.create_reminder(con, user_id, name="Test", message="✅ Recordatorio de prueba", schedule=schedule)
-    row = dbmod.get_reminder(con, user_id, rid)
-    remmod.schedule_one(app, con, row, chat.id)
-    await update.message.reply_text(f"🧪 Test creado (id={rid}) para {now.strftime('%H:%M')}.")
+    # Campos con format spec de f-string: sin pasar por strftime/locale
+    hhmm = f"{now.hour:02d}:{now.minute:02d}"
+    schedule = f"ONCE@{now.year:04d}-{now.month:02d}-{now.day:02d}@{hhmm}"
+    row = await _db_write(dbmod.create_reminder, user_id, name="Test", message="✅ Recordatorio de prueba", schedule=schedule)
+    remmod.schedule_one(app, _SETTINGS.db_path, row, chat.id)
+    await update.message.reply_text(f"🧪 Test creado (id={row['id']}) para {hhmm}.")
+
+
+# ---------------- Envio por chat ----------------
+# Las respuestas de handle_text se encolan por chat (en bot_data["send_queues"]): el handler
+# termina sin esperar el round-trip HTTP a Telegram y un worker por chat las envia en orden.
+
+
+async def _send_worker(app: Application, chat_id: int, q: asyncio.Queue) -> None:
+    # Drena la cola en orden y termina; la siguiente respuesta del chat crea otro worker
+    try:
+        while not q.empty():
+            update, text = q.get_nowait()
+            try:
+                await app.bot.send_message(chat_id=chat_id, text=text)
+            except Exception as e:
+                # Mismo camino que un error dentro de un handler: on_error
+                await app.process_error(update, e)
+    finally:
+        # Tambien si el worker se cancela o falla process_error: no dejar una cola sin worker
+        app.bot_data["send_queues"].pop(chat_id, None)
+
+
+def _enqueue_send(app: Application, update: Update, text: str) -> None:
+    chat_id = update.effective_chat.id
+    queues = app.bot_data.setdefault("send_queues", {})
+    q = queues.get(chat_id)
+    if q is None:
+        q = queues[chat_id] = asyncio.Queue()
+        # create_task de la app: al detenerse espera a que se envie lo pendiente
+        app.create_task(_send_worker(app, chat_id, q))
+    q.put_nowait((update, text))
 
 
 # ---------------- Handle Text (TAREAS + NOTAS + BUSCAR) ----------------
 
-async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings = context.application.bot_data["settings"]
-    con = context.application.bot_data["db"]
+@dataclass(frozen=True)
+class _TextCtx:
+    """
+    Lo que necesita cada handler de texto (se arma una vez por mensaje).
+    Las consultas van por _db_read/_db_write (en un hilo del pool).
+    Las fechas se calculan solo si el handler las usa (Nota:/Buscar: no leen el reloj).
+    """
+    update: Update
+    app: Application
+    user_id: int
+    msg: str
+    low: str
 
-    if not is_owner(update, settings.owner_telegram_user_id):
-        return
+    @cached_property
+    def now_dt(self) -> datetime:
+        # Solo Nota: necesita la hora exacta (now_iso)
+        return datetime.now(BOGOTA_TZ)
 
-    user = update.effective_user
-    chat = update.effective_chat
+    # Hoy/mañana salen de la cache por dia: sin leer el reloj ni formatear por mensaje
+    @property
+    def today_d(self) -> date:
+        return _today_strs()[0]
 
-    user_id = dbmod.get_user_id(con, user.id)
-    if not user_id:
-        user_id = dbmod.upsert_user(con, user.id, chat.id, user.full_name or "Juan David")
+    @property
+    def today(self) -> str:
+        return _today_strs()[1]
 
-    msg = (update.message.text or "").strip()
-    low = msg.lower()
+    @property
+    def tomorrow(self) -> str:
+        return _today_strs()[2]
 
-    today = _today_iso()
-    tomorrow = _tomorrow_iso()
-    now_iso = datetime.now(BOGOTA_TZ).isoformat(timespec="seconds")
-
-    # -------- Crear tareas --------
-    if low.startswith("pendiente:"):
-        text = msg.split(":", 1)[1].strip()
-        tid = dbmod.add_task(con, user_id, today, text)
-        await update.message.reply_text(f"✅ Tarea creada (# {tid}) para hoy.")
-        return
+    @cached_property
+    def now_iso(self) -> str:
+        return self.now_dt.isoformat(timespec="seconds")
 
-    if low.startswith("mañana:") or low.startswith("manana:"):
-        text = msg.split(":", 1)[1].strip()
-        tid = dbmod.add_task(con, user_id, tomorrow, text)
-        await update.message.reply_text(f"✅ Tarea creada (# {tid}) para mañana.")
-        return
+    def reply(self, text: str) -> None:
+        # Todas las respuestas van por la cola del chat: se envian en el orden de los mensajes
+        _enqueue_send(self.app, self.update, text)
 
-    if low.startswith("tarea:"):
-        payload = msg.split(":", 1)[1].strip()
-        if "|" not in payload:
-            await update.message.reply_text("Uso: Tarea: YYYY-MM-DD | <texto>")
-            return
-        left, text = [p.strip() for p in payload.split("|", 1)]
-        if not re.match(r"^\d{4}-\d{2}-\d{2}$", left):
-            await update.message.reply_text("Fecha inválida. Usa YYYY-MM-DD (ej: 2026-01-20).")
-            return
-        tid = dbmod.add_task(con, user_id, left, text)
-        await update.message.reply_text(f"✅ Tarea creada (# {tid}) para {left}.")
-        return
 
-    # -------- Completar --------
-    m = re.match(r"^hice\s+#(\d+)\s*$", low)
-    if m:
-        tid = int(m.group(1))
-        ok = dbmod.mark_task_done_by_id(con, user_id, tid)
-        await update.message.reply_text(f"✅ Marcada como hecha (# {tid})." if ok else f"No encontré esa tarea # {tid}.")
-        return
+# -------- Crear tareas --------
 
-    if low.startswith("hice:"):
-        text = msg.split(":", 1)[1].strip()
-        status, ids = dbmod.mark_task_done_by_text(con, user_id, text, target_date=today)
-        if status == "one":
-            await update.message.reply_text(f"✅ Marcada como hecha (# {ids[0]}).")
-        elif status == "many":
-            ids_str = ", ".join([f"#{i}" for i in ids])
-            await update.message.reply_text(f"Encontré varias tareas con ese texto hoy: {ids_str}\nEscríbeme: Hice #<id>")
-        else:
-            await update.message.reply_text("No encontré ese pendiente exacto hoy. ¿Quieres que lo guarde como tarea nueva?")
-        return
+async def _text_add_today(c: _TextCtx) -> None:
+    text = _after_colon(c.msg)
+    tid = await _db_write(dbmod.add_task, c.user_id, c.today, text)
+    c.reply(f"✅ Tarea creada (# {tid}) para hoy.")
 
-    # -------- Eliminar --------
-    m = re.match(r"^borrar\s+#(\d+)\s*$", low)
-    if m:
-        tid = int(m.group(1))
-        ok = dbmod.delete_task_by_id(con, user_id, tid)
-        await update.message.reply_text(f"🗑️ Eliminada (# {tid})." if ok else f"No encontré esa tarea # {tid}.")
-        return
 
-    # -------- Modificar --------
-    if low.startswith("mover #"):
-        # Mover #12 | 2026-01-20
-        if "|" not in msg:
-            await update.message.reply_text("Uso: Mover #<id> | YYYY-MM-DD")
-            return
-        left, new_date = [p.strip() for p in msg.split("|", 1)]
-        m2 = re.match(r"^mover\s+#(\d+)\s*$", left.lower())
-        if not m2 or not re.match(r"^\d{4}-\d{2}-\d{2}$", new_date):
-            await update.message.reply_text("Uso: Mover #<id> | YYYY-MM-DD")
-            return
-        tid = int(m2.group(1))
-        ok = dbmod.update_task_date(con, user_id, tid, new_date)
-        await update.message.reply_text(f"✏️ Actualizada (# {tid}) → {new_date}." if ok else f"No encontré esa tarea # {tid}.")
+async def _text_add_tomorrow(c: _TextCtx) -> None:
+    text = _after_colon(c.msg)
+    tid = await _db_write(dbmod.add_task, c.user_id, c.tomorrow, text)
+    c.reply(f"✅ Tarea creada (# {tid}) para mañana.")
+
+
+async def _text_add_on_date(c: _TextCtx) -> None:
+    payload = _after_colon(c.msg)
+    if "|" not in payload:
+        c.reply("Uso: Tarea: YYYY-MM-DD | <texto>")
+        return
+    left, _, text = payload.partition("|")
+    left, text = left.strip(), text.strip()
+    if not _RE_DATE.match(left):
+        c.reply("Fecha inválida. Usa YYYY-MM-DD (ej: 2026-01-20).")
         return
+    tid = await _db_write(dbmod.add_task, c.user_id, left, text)
+    c.reply(f"✅ Tarea creada (# {tid}) para {left}.")
 
-    if low.startswith("editar #"):
-        # Editar #12 | texto
-        # Editar #12 | 2026-01-20 | texto
-        parts = [p.strip() for p in msg.split("|")]
-        left = parts[0].strip()
-        m2 = re.match(r"^editar\s+#(\d+)\s*$", left.lower())
-        if not m2:
-            await update.message.reply_text("Uso: Editar #<id> | <nuevo texto>  (opcional fecha)")
-            return
-        tid = int(m2.group(1))
 
-        if len(parts) == 2:
-            new_text = parts[1]
-            ok = dbmod.update_task_text(con, user_id, tid, new_text)
-            await update.message.reply_text(f"✏️ Actualizada (# {tid})." if ok else f"No encontré esa tarea # {tid}.")
-            return
+# -------- Completar / Eliminar --------
 
-        if len(parts) >= 3:
-            maybe_date = parts[1]
-            new_text = "|".join(parts[2:]).strip()
-            if not re.match(r"^\d{4}-\d{2}-\d{2}$", maybe_date):
-                await update.message.reply_text("Fecha inválida. Usa YYYY-MM-DD.")
-                return
-            ok = dbmod.update_task_date_text(con, user_id, tid, maybe_date, new_text)
-            await update.message.reply_text(f"✏️ Actualizada (# {tid})." if ok else f"No encontré esa tarea # {tid}.")
-            return
+async def _text_done_by_id(c: _TextCtx, m: re.Match) -> None:
+    tid = int(m.group(1))
+    ok = await _db_write(dbmod.mark_task_done_by_id, c.user_id, tid)
+    c.reply(f"✅ Marcada como hecha (# {tid})." if ok else f"No encontré esa tarea # {tid}.")
 
-    # -------- Consultas --------
-    if low == "tareas hoy":
-        rows = dbmod.list_tasks_by_date(con, user_id, today, status=None)
-        if not rows:
-            await update.message.reply_text("No tienes tareas para hoy.")
-            return
-        out = "\n".join([f"{_fmt_task_line(t)}  [{t['status']}]" for t in rows])
-        await update.message.reply_text("📋 Tareas de hoy:\n" + out)
-        return
 
-    m = re.match(r"^tareas:\s*(\d{4}-\d{2}-\d{2})$", low)
-    if m:
-        d = m.group(1)
-        rows = dbmod.list_tasks_by_date(con, user_id, d, status=None)
-        if not rows:
-            await update.message.reply_text(f"No tienes tareas para {d}.")
-            return
-        out = "\n".join([f"{_fmt_task_line(t)}  [{t['status']}]" for t in rows])
-        await update.message.reply_text(f"📋 Tareas de {d}:\n" + out)
+async def _text_done_by_text(c: _TextCtx) -> None:
+    text = _after_colon(c.msg)
+    status, ids = await _db_write(dbmod.mark_task_done_by_text, c.user_id, text, target_date=c.today)
+    if status == "one":
+        c.reply(f"✅ Marcada como hecha (# {ids[0]}).")
+    elif status == "many":
+        ids_str = ", ".join(f"#{i}" for i in ids)
+        c.reply(f"Encontré varias tareas con ese texto hoy: {ids_str}\nEscríbeme: Hice #<id>")
+    else:
+        c.reply("No encontré ese pendiente exacto hoy. ¿Quieres que lo guarde como tarea nueva?")
+
+
+async def _text_delete(c: _TextCtx, m: re.Match) -> None:
+    tid = int(m.group(1))
+    ok = await _db_write(dbmod.delete_task_by_id, c.user_id, tid)
+    c.reply(f"🗑️ Eliminada (# {tid})." if ok else f"No encontré esa tarea # {tid}.")
+
+
+# -------- Modificar --------
+
+async def _text_move(c: _TextCtx) -> None:
+    # Mover #12 | 2026-01-20
+    if "|" not in c.msg:
+        c.reply("Uso: Mover #<id> | YYYY-MM-DD")
         return
+    left, _, new_date = c.msg.partition("|")
+    left, new_date = left.strip(), new_date.strip()
+    m2 = _RE_MOVER.match(left.lower())
+    if not m2 or not _RE_DATE.match(new_date):
+        c.reply("Uso: Mover #<id> | YYYY-MM-DD")
+        return
+    tid = int(m2.group(1))
+    ok = await _db_write(dbmod.update_task_date, c.user_id, tid, new_date)
+    c.reply(f"✏️ Actualizada (# {tid}) → {new_date}." if ok else f"No encontré esa tarea # {tid}.")
 
-    if low == "pendientes":
-        rows = dbmod.list_tasks_by_date(con, user_id, today, status="pending")
-        if not rows:
-            await update.message.reply_text("No hay pendientes.")
-            return
-        out = "\n".join([_fmt_task_line(t) for t in rows])
-        await update.message.reply_text("📌 Pendientes de hoy:\n" + out)
+
+async def _text_edit(c: _TextCtx) -> None:
+    # Editar #12 | texto
+    # Editar #12 | 2026-01-20 | texto
+    parts = [p.strip() for p in c.msg.split("|")]
+    left = parts[0]
+    m2 = _RE_EDITAR.match(left.lower())
+    if not m2:
+        c.reply("Uso: Editar #<id> | <nuevo texto>  (opcional fecha)")
         return
+    tid = int(m2.group(1))
 
-    if low == "hechos hoy":
-        rows = dbmod.list_tasks_by_date(con, user_id, today, status="done")
-        if not rows:
-            await update.message.reply_text("Aún no hay hechos hoy.")
-            return
-        out = "\n".join([_fmt_task_line(t) for t in rows])
-        await update.message.reply_text("✅ Hechos de hoy:\n" + out)
+    if len(parts) == 2:
+        new_text = parts[1]
+        ok = await _db_write(dbmod.update_task_text, c.user_id, tid, new_text)
+        c.reply(f"✏️ Actualizada (# {tid})." if ok else f"No encontré esa tarea # {tid}.")
         return
 
-    if low == "incumplidas hoy":
-        rows = dbmod.list_tasks_by_date(con, user_id, today, status="missed")
-        if not rows:
-            await update.message.reply_text("No hay incumplidas hoy.")
+    if len(parts) >= 3:
+        maybe_date = parts[1]
+        new_text = "|".join(parts[2:])
+        if not _RE_DATE.match(maybe_date):
+            c.reply("Fecha inválida. Usa YYYY-MM-DD.")
             return
-        out = "\n".join([_fmt_task_line(t) for t in rows])
-        await update.message.reply_text("⚠️ Incumplidas de hoy:\n" + out)
+        ok = await _db_write(dbmod.update_task_date_text, c.user_id, tid, maybe_date, new_text)
+        c.reply(f"✏️ Actualizada (# {tid})." if ok else f"No encontré esa tarea # {tid}.")
         return
 
-    if low == "pendientes semana" or low == "hechos semana" or low == "incumplidas semana" or low == "semana":
-        td = datetime.now(BOGOTA_TZ).date()
-        start, end = _week_range(td)
-
-        if low == "pendientes semana":
-            rows = dbmod.list_tasks_between(con, user_id, start, end, status="pending")
-            title = f"📌 Pendientes semana ({start} a {end})"
-        elif low == "hechos semana":
-            rows = dbmod.list_tasks_between(con, user_id, start, end, status="done")
-            title = f"✅ Hechos semana ({start} a {end})"
-        elif low == "incumplidas semana":
-            rows = dbmod.list_tasks_between(con, user_id, start, end, status="missed")
-            title = f"⚠️ Incumplidas semana ({start} a {end})"
-        else:
-            rows = dbmod.list_tasks_between(con, user_id, start, end, status=None)
-            title = f"📊 Semana ({start} a {end})"
-
-        if not rows:
-            await update.message.reply_text("No hay tareas en esa semana.")
-            return
+    # "Editar #12" sin '|': no es un comando completo
+    await _text_fallback(c)
 
-        if low == "semana":
-            # Resumen + agrupado por día
-            pending = [r for r in rows if r["status"] == "pending"]
-            done = [r for r in rows if r["status"] == "done"]
-            missed = [r for r in rows if r["status"] == "missed"]
-
-            text = f"{title}\n\n"
-            text += f"Totales: ✅ {len(done)} | 📌 {len(pending)} | ⚠️ {len(missed)}\n\n"
-
-            grouped = _group_by_date(rows)
-            for d in sorted(grouped.keys()):
-                day_rows = grouped[d]
-                text += f"{d}:\n"
-                for t in day_rows:
-                    text += f"  - {_fmt_task_line(t)} [{t['status']}]\n"
-                text += "\n"
-
-            await update.message.reply_text(text.strip())
-        else:
-            grouped = _group_by_date(rows)
-            out_lines = []
-            for d in sorted(grouped.keys()):
-                out_lines.append(d + ":")
-                out_lines.extend([f"  - {_fmt_task_line(t)}" for t in grouped[d]])
-            await update.message.reply_text(title + "\n" + "\n".join(out_lines))
+
+# -------- Consultas --------
+
+async def _text_tasks_today(c: _TextCtx) -> None:
+    rows = await _db_read(dbmod.list_tasks_by_date, c.user_id, c.today, status=None)
+    if not rows:
+        c.reply("No tienes tareas para hoy.")
         return
+    out = "\n".join(f"{_fmt_task_line(t)}  [{t['status']}]" for t in rows)
+    c.reply("📋 Tareas de hoy:\n" + out)
 
-    if low == "pendientes todos":
-        rows = dbmod.list_tasks_global(con, user_id, status="pending")
-        if not rows:
-            await update.message.reply_text("No hay pendientes.")
-            return
-        out = "\n".join([f"{t['target_date']} - {_fmt_task_line(t)}" for t in rows])
-        await update.message.reply_text("📌 Pendientes (global):\n" + out)
+
+async def _text_tasks_on_date(c: _TextCtx, m: re.Match) -> None:
+    d = m.group(1)
+    rows = await _db_read(dbmod.list_tasks_by_date, c.user_id, d, status=None)
+    if not rows:
+        c.reply(f"No tienes tareas para {d}.")
         return
+    out = "\n".join(f"{_fmt_task_line(t)}  [{t['status']}]" for t in rows)
+    c.reply(f"📋 Tareas de {d}:\n" + out)
 
-    if low == "hechos todos":
-        rows = dbmod.list_tasks_global(con, user_id, status="done")
-        if not rows:
-            await update.message.reply_text("No hay hechos.")
-            return
-        out = "\n".join([f"{t['target_date']} - {_fmt_task_line(t)}" for t in rows])
-        await update.message.reply_text("✅ Hechos (global):\n" + out)
+
+async def _text_today_by_status(c: _TextCtx, status: str, empty: str, title: str) -> None:
+    rows = await _db_read(dbmod.list_tasks_by_date, c.user_id, c.today, status=status)
+    if not rows:
+        c.reply(empty)
         return
+    out = "\n".join(_fmt_task_line(t) for t in rows)
+    c.reply(title + "\n" + out)
 
-    if low == "incumplidas todos":
-        rows = dbmod.list_tasks_global(con, user_id, status="missed")
-        if not rows:
-            await update.message.reply_text("No hay incumplidas.")
-            return
-        out = "\n".join([f"{t['target_date']} - {_fmt_task_line(t)}" for t in rows])
-        await update.message.reply_text("⚠️ Incumplidas (global):\n" + out)
+
+async def _text_week_by_status(c: _TextCtx, status: str, title: str) -> None:
+    start, end = _week_range(c.today_d)
+    rows = await _db_read(dbmod.list_tasks_between, c.user_id, start, end, status=status)
+    if not rows:
+        c.reply("No hay tareas en esa semana.")
         return
 
-    # -------- Resumen (compatibilidad) --------
-    if low == "resumen":
-        pend = dbmod.list_tasks_by_date(con, user_id, today, "pending")
-        done = dbmod.list_tasks_by_date(con, user_id, today, "done")
-        missed = dbmod.list_tasks_by_date(con, user_id, today, "missed")
-        notes = dbmod.list_notes_by_date(con, user_id, today)
+    # list_tasks_between ya viene ORDER BY target_date, id: se agrupa en una pasada
+    out_lines = []
+    for d, day_rows in groupby(rows, key=_task_date):
+        out_lines.append(d + ":")
+        out_lines.extend(f"  - {_fmt_task_line(t)}" for t in day_rows)
+    c.reply(f"{title} ({start} a {end})" + "\n" + "\n".join(out_lines))
 
-        text = "📊 Resumen de hoy\n\n"
-        text += "✅ Hechos:\n" + ("\n".join([_fmt_task_line(t) for t in done]) if done else "- (ninguno)") + "\n\n"
-        text += "📌 Pendientes:\n" + ("\n".join([_fmt_task_line(t) for t in pend]) if pend else "- (ninguno)") + "\n\n"
-        text += "⚠️ Incumplidas:\n" + ("\n".join([_fmt_task_line(t) for t in missed]) if missed else "- (ninguna)") + "\n\n"
-        text += "📝 Notas:\n" + ("\n".join([f"- {n['text']}" for n in notes]) if notes else "- (ninguna)")
 
-        await update.message.reply_text(text)
+async def _text_week(c: _TextCtx) -> None:
+    start, end = _week_range(c.today_d)
+    rows = await _db_read(dbmod.list_tasks_between, c.user_id, start, end, status=None)
+    if not rows:
+        c.reply("No hay tareas en esa semana.")
         return
 
-    # -------- Notas --------
-    if low.startswith("nota:"):
-        text = msg.split(":", 1)[1].strip()
-        dbmod.add_note(con, user_id, now_iso, text)
-        await update.message.reply_text("📝 Nota guardada.")
+    # Resumen + agrupado por día
+    pending = [r for r in rows if r["status"] == "pending"]
+    done = [r for r in rows if r["status"] == "done"]
+    missed = [r for r in rows if r["status"] == "missed"]
+
+    # Lineas en una lista y un solo join (sin += sobre el texto completo)
+    parts = [
+        f"📊 Semana ({start} a {end})",
+        "",
+        f"Totales: ✅ {len(done)} | 📌 {len(pending)} | ⚠️ {len(missed)}",
+        "",
+    ]
+
+    for d, day_rows in groupby(rows, key=_task_date):
+        parts.append(f"{d}:")
+        parts.extend(f"  - {_fmt_task_line(t)} [{t['status']}]" for t in day_rows)
+        parts.append("")
+
+    c.reply("\n".join(parts).strip())
+
+
+async def _text_global_by_status(c: _TextCtx, status: str, empty: str, title: str) -> None:
+    rows = await _db_read(dbmod.list_tasks_global, c.user_id, status=status)
+    if not rows:
+        c.reply(empty)
         return
+    out = "\n".join(f"{t['target_date']} - {_fmt_task_line(t)}" for t in rows)
+    c.reply(title + "\n" + out)
+
+
+# -------- Resumen (compatibilidad) --------
+
+async def _text_summary(c: _TextCtx) -> None:
+    # Una sola consulta para las tareas del dia; se reparten por estado en Python
+    rows = await _db_read(dbmod.list_tasks_by_date, c.user_id, c.today, status=None)
+    pend = [t for t in rows if t["status"] == "pending"]
+    done = [t for t in rows if t["status"] == "done"]
+    missed = [t for t in rows if t["status"] == "missed"]
+    notes = await _db_read(dbmod.list_notes_by_date, c.user_id, c.today)
+
+    text = "📊 Resumen de hoy\n\n"
+    text += "✅ Hechos:\n" + ("\n".join(_fmt_task_line(t) for t in done) if done else "- (ninguno)") + "\n\n"
+    text += "📌 Pendientes:\n" + ("\n".join(_fmt_task_line(t) for t in pend) if pend else "- (ninguno)") + "\n\n"
+    text += "⚠️ Incumplidas:\n" + ("\n".join(_fmt_task_line(t) for t in missed) if missed else "- (ninguna)") + "\n\n"
+    text += "📝 Notas:\n" + ("\n".join(f"- {n['text']}" for n in notes) if notes else "- (ninguna)")
+
+    c.reply(text)
+
 
-    # -------- Buscar --------
-    if low.startswith("buscar:"):
-        needle = msg.split(":", 1)[1].strip()
-        res = dbmod.search_all(con, user_id, needle)
-        lines = []
-        if res["tasks"]:
-            lines.append("📌 Tareas:")
-            lines.extend([f"- {t['target_date']} [{t['status']}] #{t['id']} - {t['text']}" for t in res["tasks"]])
-        if res["notes"]:
-            lines.append("\n📝 Notas:")
-            lines.extend([f"- {n['note_datetime']} {n['text']}" for n in res["notes"]])
-        await update.message.reply_text("\n".join(lines) if lines else "No encontré coincidencias.")
+# -------- Notas / Buscar --------
+
+async def _text_add_note(c: _TextCtx) -> None:
+    text = _after_colon(c.msg)
+    await _db_write(dbmod.add_note, c.user_id, c.now_iso, text)
+    c.reply("📝 Nota guardada.")
+
+
+async def _text_search(c: _TextCtx) -> None:
+    await _reply_search(c, _after_colon(c.msg), None)
+
+
+async def _text_search_more(c: _TextCtx) -> None:
+    # Siguiente pagina de la ultima busqueda del usuario (cursor guardado en bot_data)
+    last = c.app.bot_data.get("search_more", {}).get(c.user_id)
+    if last is None:
+        c.reply("No hay más resultados. Busca con: Buscar: <texto>")
         return
+    await _reply_search(c, *last)
 
-    # fallback
-    await update.message.reply_text(
+
+async def _reply_search(c: _TextCtx, needle: str, after: Optional[tuple[str, int]]) -> None:
+    res = await _db_read(dbmod.search_all, c.user_id, needle, after=after)
+    lines = []
+    if res["tasks"]:
+        lines.append("📌 Tareas:")
+        lines.extend(f"- {t['target_date']} [{t['status']}] #{t['id']} - {t['text']}" for t in res["tasks"])
+    if res["notes"]:
+        lines.append("\n📝 Notas:")
+        lines.extend(f"- {n['note_datetime']} {n['text']}" for n in res["notes"])
+
+    pending = c.app.bot_data.setdefault("search_more", {})
+    if res["next"]:
+        pending[c.user_id] = (needle, res["next"])
+        lines.append(f"\n(Mostrando {dbmod.SEARCH_PAGE_SIZE}; escribe \"Buscar más\" para ver los siguientes.)")
+    else:
+        pending.pop(c.user_id, None)
+
+    if lines:
+        c.reply("\n".join(lines))
+    else:
+        c.reply("No hay más resultados." if after else "No encontré coincidencias.")
+
+
+async def _text_fallback(c: _TextCtx) -> None:
+    c.reply(
         "No entendí.\n"
         "Ejemplos:\n"
         "• Pendiente: estudiar 1 hora\n"
@@ -629,10 +785,86 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     )
 
 
+# -------- Tablas de despacho --------
+# Comandos exactos: un lookup en el dict en vez de recorrer la cascada de if
+_EXACT_HANDLERS: dict[str, Callable[[_TextCtx], Awaitable[None]]] = {
+    "tareas hoy": _text_tasks_today,
+    "pendientes": partial(_text_today_by_status, status="pending", empty="No hay pendientes.", title="📌 Pendientes de hoy:"),
+    "hechos hoy": partial(_text_today_by_status, status="done", empty="Aún no hay hechos hoy.", title="✅ Hechos de hoy:"),
+    "incumplidas hoy": partial(_text_today_by_status, status="missed", empty="No hay incumplidas hoy.", title="⚠️ Incumplidas de hoy:"),
+    "semana": _text_week,
+    "pendientes semana": partial(_text_week_by_status, status="pending", title="📌 Pendientes semana"),
+    "hechos semana": partial(_text_week_by_status, status="done", title="✅ Hechos semana"),
+    "incumplidas semana": partial(_text_week_by_status, status="missed", title="⚠️ Incumplidas semana"),
+    "pendientes todos": partial(_text_global_by_status, status="pending", empty="No hay pendientes.", title="📌 Pendientes (global):"),
+    "hechos todos": partial(_text_global_by_status, status="done", empty="No hay hechos.", title="✅ Hechos (global):"),
+    "incumplidas todos": partial(_text_global_by_status, status="missed", empty="No hay incumplidas.", title="⚠️ Incumplidas (global):"),
+    "resumen": _text_summary,
+    "buscar más": _text_search_more,
+    "buscar mas": _text_search_more,
+}
+
+# Comandos con argumento: se prueban en orden. Sinonimos como tupla (startswith acepta tuplas)
+_PREFIX_HANDLERS: tuple[tuple[str | tuple[str, ...], Callable[[_TextCtx], Awaitable[None]]], ...] = (
+    ("pendiente:", _text_add_today),
+    (("mañana:", "manana:"), _text_add_tomorrow),
+    ("tarea:", _text_add_on_date),
+    ("hice:", _text_done_by_text),
+    ("mover #", _text_move),
+    ("editar #", _text_edit),
+    ("nota:", _text_add_note),
+    ("buscar:", _text_search),
+)
+
+_REGEX_HANDLERS: tuple[tuple[re.Pattern, Callable[[_TextCtx, re.Match], Awaitable[None]]], ...] = (
+    (_RE_HICE, _text_done_by_id),
+    (_RE_BORRAR, _text_delete),
+    (_RE_TAREAS_DATE, _text_tasks_on_date),
+)
+
+
+async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user = update.effective_user
+    chat = update.effective_chat
+
+    # Usuario ya conocido: sale de la cache sin tocar la DB ni saltar a un hilo
+    user_id = dbmod.cached_user_id(user.id) or await _db_write(
+        dbmod.ensure_user, user.id, chat.id, user.full_name or "Juan David"
+    )
+
+    msg = (update.message.text or "").strip()
+    low = msg.lower()
+
+    c = _TextCtx(update=update, app=context.application, user_id=user_id, msg=msg, low=low)
+
+    handler = _EXACT_HANDLERS.get(low)
+    if handler:
+        await handler(c)
+        return
+
+    for prefix, handler in _PREFIX_HANDLERS:
+        if low.startswith(prefix):
+            await handler(c)
+            return
+
+    for pattern, handler in _REGEX_HANDLERS:
+        m = pattern.match(low)
+        if m:
+            await handler(c, m)
+            return
+
+    await _text_fallback(c)
+
+
 def main() -> None:
+    global _CON, _SETTINGS, _OWNER_ID
+
     settings = get_settings()
-    con = dbmod.connect(settings.db_path)
+    con = dbmod.get_connection(settings.db_path)
     dbmod.init_db(con)
+    _SETTINGS = settings
+    _CON = con
+    _OWNER_ID = settings.owner_telegram_user_id
 
     defaults = Defaults(tzinfo=BOGOTA_TZ)
 
@@ -646,32 +878,24 @@ def main() -> None:
 
     app.add_error_handler(on_error)
 
-    app.bot_data["settings"] = settings
-    app.bot_data["db"] = con
+    # Solo el dueño: el filtro descarta al resto antes de despachar el handler.
+    # /start queda abierto para responder "Este bot es privado." a los demas.
+    owner_only = filters.User(user_id=_OWNER_ID)
 
     # comandos base
     app.add_handler(CommandHandler("start", cmd_start))
-    app.add_handler(CommandHandler("export", cmd_export))
+    app.add_handler(CommandHandler("export", cmd_export, filters=owner_only))
 
     # recordatorios (si los usas)
-    app.add_handler(CommandHandler("rem_add", cmd_rem_add))
-    app.add_handler(CommandHandler("rem_list", cmd_rem_list))
-    app.add_handler(CommandHandler("rem_on", cmd_rem_on))
-    app.add_handler(CommandHandler("rem_off", cmd_rem_off))
-    app.add_handler(CommandHandler("rem_del", cmd_rem_del))
-    app.add_handler(CommandHandler("rem_test", cmd_rem_test))
+    app.add_handler(CommandHandler("rem_add", cmd_rem_add, filters=owner_only))
+    app.add_handler(CommandHandler("rem_list", cmd_rem_list, filters=owner_only))
+    app.add_handler(CommandHandler("rem_on", cmd_rem_on, filters=owner_only))
+    app.add_handler(CommandHandler("rem_off", cmd_rem_off, filters=owner_only))
+    app.add_handler(CommandHandler("rem_del", cmd_rem_del, filters=owner_only))
+    app.add_handler(CommandHandler("rem_test", cmd_rem_test, filters=owner_only))
 
     # texto (tareas/notas/buscar)
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
-
-    # Programar recordatorios existentes (tu módulo)
-    try:
-        remmod.schedule_all_active(app, con)
-    except Exception as e:
-        log.warning("No pude programar recordatorios al inicio: %s", e)
-
-    # Programar cierre del día (tareas pending -> missed)
-    schedule_close_day(app)
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND & owner_only, handle_text))
 
     log.info("Bot iniciado. Polling local...")
     app.run_polling(close_loop=False)
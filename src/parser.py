@@ -1,9 +1,12 @@
 from __future__ import annotations
 
 from datetime import date
+from functools import lru_cache
 from typing import Optional, Tuple
 
 
+# Resultados inmutables (tupla/date): se pueden compartir entre llamadas
+@lru_cache(maxsize=512)
 def parse_hhmm(text: str) -> Optional[Tuple[int, int]]:
     t = text.strip()
     if len(t) != 5 or t[2] != ":":
@@ -18,6 +21,7 @@ def parse_hhmm(text: str) -> Optional[Tuple[int, int]]:
     return h, m
 
 
+@lru_cache(maxsize=512)
 def parse_yyyy_mm_dd(text: str) -> Optional[date]:
     try:
         return date.fromisoformat(text.strip())
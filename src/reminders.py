@@ -2,10 +2,13 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import re
 from dataclasses import dataclass
-from datetime import datetime, timezone as dt_timezone
-from typing import Optional
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from typing import Any, Mapping, Optional
 
+from apscheduler.schedulers.base import STATE_RUNNING
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.date import DateTrigger
 from telegram.ext import Application
@@ -17,11 +20,14 @@ from parser import parse_hhmm, parse_yyyy_mm_dd
 log = logging.getLogger("cortana.reminders")
 
 DAY_TOKENS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+_DAY_TOKENS_SET = frozenset(DAY_TOKENS)
 WEEKDAY_DOW = "mon,tue,wed,thu,fri"
 WEEKEND_DOW = "sat,sun"
 EVERYDAY_DOW = "mon,tue,wed,thu,fri,sat,sun"
 
 
+# Una zona por nombre: sin repetir la busqueda (ni el try/except) en cada build_trigger
+@lru_cache(maxsize=64)
 def get_tz(tzname: str) -> ZoneInfo | dt_timezone:
     try:
         return ZoneInfo(tzname)
@@ -30,7 +36,7 @@ def get_tz(tzname: str) -> ZoneInfo | dt_timezone:
         return dt_timezone.utc
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ParsedSchedule:
     kind: str  # WEEKDAY/WEEKEND/DAYS/ONCE/EVERYDAY
     dow: Optional[str]          # "mon,tue"...
@@ -38,52 +44,71 @@ class ParsedSchedule:
     hhmm: str                   # "HH:MM"
 
 
+# TIPO@resto en una sola pasada (tipo sin importar mayúsculas); el resto lo valida
+# el parser de cada tipo
+_SCHEDULE_RE = re.compile(r"^(WEEKDAY|WEEKEND|EVERYDAY|DAILY|DAYS|ONCE)@(.*)$", re.IGNORECASE | re.DOTALL)
+
+# Tipos de dias fijos -> (kind, dow). DAILY es alias de EVERYDAY
+_FIXED_DOW = {
+    "WEEKDAY": ("WEEKDAY", WEEKDAY_DOW),
+    "WEEKEND": ("WEEKEND", WEEKEND_DOW),
+    "EVERYDAY": ("EVERYDAY", EVERYDAY_DOW),
+    "DAILY": ("EVERYDAY", EVERYDAY_DOW),
+}
+
+
+def _parse_fixed(kind: str, rest: str) -> ParsedSchedule:
+    # WEEKDAY@HH:MM, WEEKEND@HH:MM, EVERYDAY@HH:MM
+    _validate_time(rest)
+    kind, dow = _FIXED_DOW[kind]
+    return ParsedSchedule(kind=kind, dow=dow, date_once=None, hhmm=rest)
+
+
+def _parse_days(kind: str, rest: str) -> ParsedSchedule:
+    # DAYS@mon,tue@HH:MM
+    parts = rest.split("@")
+    if len(parts) != 2:
+        raise ValueError("Formato DAYS invalido. Usa: DAYS@mon,tue@HH:MM")
+    days_part, hhmm = parts
+    _validate_time(hhmm)
+    dow = _validate_days_part(days_part)
+    return ParsedSchedule(kind="DAYS", dow=dow, date_once=None, hhmm=hhmm)
+
+
+def _parse_once(kind: str, rest: str) -> ParsedSchedule:
+    # ONCE@YYYY-MM-DD@HH:MM
+    parts = rest.split("@")
+    if len(parts) != 2:
+        raise ValueError("Formato ONCE invalido. Usa: ONCE@YYYY-MM-DD@HH:MM")
+    date_part, hhmm = parts
+    if not parse_yyyy_mm_dd(date_part):
+        raise ValueError("Fecha invalida. Usa YYYY-MM-DD")
+    _validate_time(hhmm)
+    return ParsedSchedule(kind="ONCE", dow=None, date_once=date_part, hhmm=hhmm)
+
+
+_SCHEDULE_PARSERS = {
+    "WEEKDAY": _parse_fixed,
+    "WEEKEND": _parse_fixed,
+    "EVERYDAY": _parse_fixed,
+    "DAILY": _parse_fixed,
+    "DAYS": _parse_days,
+    "ONCE": _parse_once,
+}
+
+
+# Pocos schedules distintos y muy repetidos (arranque, cada disparo): se parsean una vez.
+# ParsedSchedule es frozen, se puede compartir; los ValueError no se cachean.
+@lru_cache(maxsize=512)
 def parse_schedule(schedule: str) -> ParsedSchedule:
-    s = schedule.strip()
-
-    # Permitir mayúsculas/minúsculas en el "tipo"
-    up = s.upper()
-
-    if up.startswith("WEEKDAY@"):
-        hhmm = s.split("@", 1)[1]
-        _validate_time(hhmm)
-        return ParsedSchedule(kind="WEEKDAY", dow=WEEKDAY_DOW, date_once=None, hhmm=hhmm)
-
-    if up.startswith("WEEKEND@"):
-        hhmm = s.split("@", 1)[1]
-        _validate_time(hhmm)
-        return ParsedSchedule(kind="WEEKEND", dow=WEEKEND_DOW, date_once=None, hhmm=hhmm)
-
-    if up.startswith("EVERYDAY@") or up.startswith("DAILY@"):
-        hhmm = s.split("@", 1)[1]
-        _validate_time(hhmm)
-        return ParsedSchedule(kind="EVERYDAY", dow=EVERYDAY_DOW, date_once=None, hhmm=hhmm)
-
-    if up.startswith("DAYS@"):
-        parts = s.split("@")
-        # DAYS@mon,tue@HH:MM
-        if len(parts) != 3:
-            raise ValueError("Formato DAYS invalido. Usa: DAYS@mon,tue@HH:MM")
-        _, days_part, hhmm = parts
-        _validate_time(hhmm)
-        dow = _validate_days_part(days_part)
-        return ParsedSchedule(kind="DAYS", dow=dow, date_once=None, hhmm=hhmm)
-
-    if up.startswith("ONCE@"):
-        parts = s.split("@")
-        # ONCE@YYYY-MM-DD@HH:MM
-        if len(parts) != 3:
-            raise ValueError("Formato ONCE invalido. Usa: ONCE@YYYY-MM-DD@HH:MM")
-        _, date_part, hhmm = parts
-        if not parse_yyyy_mm_dd(date_part):
-            raise ValueError("Fecha invalida. Usa YYYY-MM-DD")
-        _validate_time(hhmm)
-        return ParsedSchedule(kind="ONCE", dow=None, date_once=date_part, hhmm=hhmm)
-
-    raise ValueError(
-        "Schedule invalido. Soportados: WEEKDAY@HH:MM, WEEKEND@HH:MM, EVERYDAY@HH:MM, "
-        "DAYS@mon,tue@HH:MM, ONCE@YYYY-MM-DD@HH:MM"
-    )
+    m = _SCHEDULE_RE.match(schedule.strip())
+    if m is None:
+        raise ValueError(
+            "Schedule invalido. Soportados: WEEKDAY@HH:MM, WEEKEND@HH:MM, EVERYDAY@HH:MM, "
+            "DAYS@mon,tue@HH:MM, ONCE@YYYY-MM-DD@HH:MM"
+        )
+    kind = m.group(1).upper()
+    return _SCHEDULE_PARSERS[kind](kind, m.group(2))
 
 
 def _validate_time(hhmm: str) -> None:
@@ -91,47 +116,75 @@ def _validate_time(hhmm: str) -> None:
         raise ValueError("Hora invalida. Usa HH:MM (ej: 08:00)")
 
 
+@lru_cache(maxsize=512)
 def _validate_days_part(days_part: str) -> str:
     raw = days_part.strip().lower()
     tokens = [t.strip() for t in raw.split(",") if t.strip()]
     if not tokens:
         raise ValueError("DAYS requiere al menos un dia (mon,tue,...)")
     for t in tokens:
-        if t not in DAY_TOKENS:
+        if t not in _DAY_TOKENS_SET:
             raise ValueError(f"Dia invalido '{t}'. Usa: {', '.join(DAY_TOKENS)}")
-    # CronTrigger acepta "mon,tue" tal cual
-    return ",".join(tokens)
+    # Forma canonica: sin repetidos y en orden de semana ("tue,mon,mon" -> "mon,tue"),
+    # asi dias equivalentes comparten ParsedSchedule y CronTrigger en cache
+    present = frozenset(tokens)
+    return ",".join(d for d in DAY_TOKENS if d in present)
 
 
 def job_id_for(user_id: int, reminder_id: int) -> str:
     return f"rem_{user_id}_{reminder_id}"
 
 
-def build_trigger(parsed: ParsedSchedule, tzname: str):
-    tz = get_tz(tzname)
+# CronTrigger no guarda estado entre disparos: uno por (dias, hora, tz) sirve para todos los jobs
+@lru_cache(maxsize=512)
+def _cron_trigger(dow: str, hour: int, minute: int, tzname: str) -> CronTrigger:
+    return CronTrigger(
+        day_of_week=dow,
+        hour=hour,
+        minute=minute,
+        second=0,
+        timezone=get_tz(tzname),
+    )
 
+
+def build_trigger(parsed: ParsedSchedule, tzname: str, not_before: Optional[datetime] = None):
+    """
+    CronTrigger (recurrentes) o DateTrigger (ONCE).
+    None si es ONCE y su hora ya es anterior a not_before (vencido: no hay nada que programar).
+    """
     hhmm_parsed = parse_hhmm(parsed.hhmm)
     assert hhmm_parsed is not None
     hour, minute = hhmm_parsed
 
     if parsed.kind in ("WEEKDAY", "WEEKEND", "DAYS", "EVERYDAY"):
-        return CronTrigger(
-            day_of_week=parsed.dow,
-            hour=hour,
-            minute=minute,
-            second=0,
-            timezone=tz,
-        )
+        return _cron_trigger(parsed.dow, hour, minute, tzname)
+
+    tz = get_tz(tzname)
 
     # ONCE
     d = parse_yyyy_mm_dd(parsed.date_once or "")
     if d is None:
         raise ValueError("Fecha invalida para ONCE")
     run_dt = datetime(d.year, d.month, d.day, hour, minute, 0, tzinfo=tz)
+    if not_before is not None and run_dt < not_before:
+        return None
     return DateTrigger(run_date=run_dt, timezone=tz)
 
 
-def schedule_one(app: Application, con, reminder_row: dict, chat_id: int, misfire_grace_seconds: int = 300) -> None:
+def schedule_one(
+    app: Application,
+    db_path: str,
+    reminder_row: Mapping[str, Any],
+    chat_id: int,
+    misfire_grace_seconds: int = 300,
+) -> bool:
+    """
+    Programa (o reemplaza) el job del recordatorio; solo toca el scheduler, no la DB
+    (las escrituras las hace el llamador). Se llama desde los handlers y, al arrancar,
+    desde schedule_all_active en un hilo del executor. db_path viaja en los args del job.
+    Retorna False si no quedo programado:
+    fila inactiva, o ONCE cuya hora ya paso (el llamador lo desactiva y avisa).
+    """
     scheduler = app.job_queue.scheduler  # APScheduler AsyncIOScheduler
 
     user_id = int(reminder_row["user_id"])
@@ -140,38 +193,27 @@ def schedule_one(app: Application, con, reminder_row: dict, chat_id: int, misfir
 
     if int(reminder_row["active"]) != 1:
         unschedule_one(app, user_id, rid)
-        return
+        return False
 
     parsed = parse_schedule(reminder_row["schedule"])
-    trigger = build_trigger(parsed, reminder_row.get("timezone") or "America/Bogota")
-
-    def _runner():
-        loop = app.bot_data.get("loop")
-
-        if loop is None:
-            # fallback (muy raro)
-            try:
-                app.create_task(_run_reminder_async(app, con, rid, chat_id))
-            except RuntimeError as e:
-                log.error("No hay event loop disponible: %s", e)
-            return
-
-        fut = asyncio.run_coroutine_threadsafe(
-            _run_reminder_async(app, con, rid, chat_id),
-            loop,
-        )
-
-        def _done_callback(f):
-            try:
-                f.result()
-            except Exception as ex:
-                log.exception("Error ejecutando reminder async: %s", ex)
-
-        fut.add_done_callback(_done_callback)
-
-    job = scheduler.add_job(
-        _runner,
+    not_before = None
+    if parsed.kind == "ONCE":
+        # Con el margen de misfire: lo que el scheduler todavia dispararia no se descarta
+        not_before = datetime.now(dt_timezone.utc) - timedelta(seconds=misfire_grace_seconds)
+    trigger = build_trigger(parsed, reminder_row["timezone"] or "America/Bogota", not_before=not_before)
+    if trigger is None:
+        # ONCE vencido (comun al reiniciar): sin add_job ni misfire en el scheduler
+        unschedule_one(app, user_id, rid)
+        return False
+
+    # El JobQueue de PTB usa AsyncIOScheduler + AsyncIOExecutor: un job corrutina corre
+    # directo en el loop del bot. Funcion de modulo + args: sin un closure por recordatorio.
+    # Nombre/mensaje/is_once viajan en los args: al disparar no se relee la fila ni se
+    # parsea el schedule (editar un recordatorio pasa por schedule_one, que reemplaza el job).
+    scheduler.add_job(
+        _run_reminder_async,
         trigger=trigger,
+        args=(app, db_path, rid, user_id, chat_id, reminder_row["name"], reminder_row["message"], parsed.kind == "ONCE", trigger),
         id=jid,
         name=jid,
         replace_existing=True,
@@ -179,62 +221,109 @@ def schedule_one(app: Application, con, reminder_row: dict, chat_id: int, misfir
         coalesce=True,
         max_instances=1,
     )
-
-    # En algunos entornos (Termux) el scheduler aún no ha iniciado y Job no tiene next_run_time.
-    # Lo dejamos en NULL y luego lo calculamos cuando el scheduler esté corriendo.
-    dbmod.update_reminder_run_times(con, rid, last_run_at=None, next_run_at=None)
+    return True
 
 
 def unschedule_one(app: Application, user_id: int, reminder_id: int) -> None:
     scheduler = app.job_queue.scheduler
     jid = job_id_for(user_id, reminder_id)
-    try:
+    # Lo comun (editar/apagar algo no programado) es que no exista: un get_job en vez
+    # de crear y descartar un JobLookupError
+    if scheduler.get_job(jid) is not None:
         scheduler.remove_job(jid)
-    except Exception:
-        pass
 
 
-def schedule_all_active(app: Application, con) -> None:
+def schedule_all_active(app: Application, db_path: str) -> None:
     # programar todos los recordatorios activos de todos los usuarios
-    cur = con.cursor()
-    cur.execute("SELECT * FROM reminders WHERE active=1")
-    rows = [dict(r) for r in cur.fetchall()]
-    for r in rows:
-        user_id = int(r["user_id"])
-        chat_id = dbmod.get_user_chat_id(con, user_id)
-        if not chat_id:
-            continue
-        schedule_one(app, con, r, chat_id)
-
-
-async def _run_reminder_async(app: Application, con, reminder_id: int, chat_id: int) -> None:
-    row = dbmod.get_reminder_by_id(con, reminder_id)
-    if not row:
-        return
-    if int(row["active"]) != 1:
-        return
+    scheduler = app.job_queue.scheduler
+    scheduled: list[int] = []
+    stale: list[int] = []
+
+    # Un JOIN con users trae el chat_id (sin get_user_chat_id por recordatorio). Se lee todo
+    # antes de programar, por la conexion RO de este hilo: ni el cursor queda abierto ni
+    # se toca la conexion RW mientras se hacen los add_job
+    rows = list(dbmod.iter_active_reminders_with_chat(dbmod.get_read_connection(db_path)))
+
+    # Si el scheduler ya corre, pausado mientras se agregan: un solo despertar al final
+    was_running = scheduler.state == STATE_RUNNING
+    if was_running:
+        scheduler.pause()
+    try:
+        for r in rows:
+            if schedule_one(app, db_path, r, int(r["chat_id"])):
+                scheduled.append(int(r["id"]))
+            else:
+                stale.append(int(r["id"]))
+    finally:
+        if was_running:
+            scheduler.resume()
 
-    name = row["name"]
-    message = row["message"]
-    schedule = row["schedule"]
+    # En algunos entornos (Termux) el scheduler aún no ha iniciado y Job no tiene next_run_time.
+    # Lo dejamos en NULL y luego lo calculamos cuando el scheduler esté corriendo.
+    # Una transaccion corta al final: run times en NULL (executemany) y ONCE vencidos apagados
+    con = dbmod.get_connection(db_path)
+    with dbmod.transaction(con):
+        dbmod.clear_reminder_run_times(con, scheduled)
+        dbmod.deactivate_reminders(con, stale)
+
+
+async def _run_reminder_async(
+    app: Application,
+    db_path: str,
+    reminder_id: int,
+    user_id: int,
+    chat_id: int,
+    name: str,
+    message: str,
+    is_once: bool,
+    trigger,
+) -> None:
+    try:
+        await _run_reminder(app, db_path, reminder_id, user_id, chat_id, name, message, is_once, trigger)
+    except Exception as ex:
+        log.exception("Error ejecutando reminder async: %s", ex)
+
+
+def _active_flag(db_path: str, reminder_id: int) -> Optional[bool]:
+    # Corre en un hilo del pool: usa la conexion RO de ese hilo
+    return dbmod.get_reminder_active_flag(dbmod.get_read_connection(db_path), reminder_id)
+
+
+async def _run_reminder(
+    app: Application,
+    db_path: str,
+    reminder_id: int,
+    user_id: int,
+    chat_id: int,
+    name: str,
+    message: str,
+    is_once: bool,
+    trigger,
+) -> None:
+    # Solo el flag active (pudo apagarse/borrarse desde otro lado); el resto viene en los args
+    # Corre en el loop del bot: la DB va por asyncio.to_thread (db.transaction serializa
+    # las escrituras en el hilo), el loop no espera al lock de escritura
+    if not await asyncio.to_thread(_active_flag, db_path, reminder_id):
+        return
 
     text = f"⏰ {name}: {message}"
     await app.bot.send_message(chat_id=chat_id, text=text)
 
-    # actualizar last_run_at
-    last = datetime.now().isoformat(timespec="seconds")
+    # actualizar last_run_at: una sola lectura del reloj, con zona (UTC); next_run_at
+    # tambien lleva offset, asi ambos se comparan sin adivinar la zona
+    now = datetime.now(dt_timezone.utc)
+    last = now.isoformat(timespec="seconds")
+
+    con = dbmod.get_connection(db_path)  # conexion RW del proceso (la misma que abrio main)
 
     # si es ONCE, auto-desactivar y cancelar job
-    parsed = parse_schedule(schedule)
-    if parsed.kind == "ONCE":
-        dbmod.update_reminder_active(con, int(row["user_id"]), int(row["id"]), 0)
-        unschedule_one(app, int(row["user_id"]), int(row["id"]))
-        dbmod.update_reminder_run_times(con, int(row["id"]), last_run_at=last, next_run_at=None)
+    if is_once:
+        await asyncio.to_thread(dbmod.finish_once_reminder, con, user_id, reminder_id, last_run_at=last)
+        unschedule_one(app, user_id, reminder_id)
         return
 
-    # si es recurrente, actualizar next_run_at desde scheduler
-    jid = job_id_for(int(row["user_id"]), int(row["id"]))
-    job = app.job_queue.scheduler.get_job(jid)
-    next_run_dt = getattr(job, "next_run_time", None) if job else None
+    # si es recurrente, el proximo disparo sale del mismo trigger del job,
+    # sin consultar el jobstore del scheduler
+    next_run_dt = trigger.get_next_fire_time(now, now)
     next_run = next_run_dt.isoformat() if next_run_dt else None
-    dbmod.update_reminder_run_times(con, int(row["id"]), last_run_at=last, next_run_at=next_run)
+    await asyncio.to_thread(dbmod.update_reminder_run_times, con, reminder_id, last_run_at=last, next_run_at=next_run)